@@ -1,23 +1,39 @@
 import hashlib
+import base64
+import json
 import time
 import re
 import arrow
 
-from matthuisman import userdata, plugin, settings
-from matthuisman.session import Session
+from matthuisman import userdata, plugin, settings, threads, cache, mem_cache
+from matthuisman.util import hash_6
+from matthuisman import session
 from matthuisman.log import log
 from matthuisman.exceptions import Error
 
-from .constants import HEADERS, AUTH_URL, RENEW_URL, CHANNELS_URL, TOKEN_URL, DEVICE_IP, CONTENT_URL, PLAY_URL, WIDEVINE_URL, SUBSCRIPTIONS_URL, PLAY_CHANNEL_URL, EPG_URL
+from .constants import HEADERS, AUTH_URL, RENEW_URL, CHANNELS_URL, TOKEN_URL, DEVICE_IP, CONTENT_URL, PLAY_URL, EPG_HOST, WIDEVINE_URL, SUBSCRIPTIONS_URL, PLAY_CHANNEL_URL, EPG_URL, EPG_CHUNK_SIZE, CONTENT_PAGE_SIZE, CONTENT_EXPIRY, CONTENT_STALE, SERIES_EXPIRY, SERIES_STALE, CHANNELS_EXPIRY, CHANNELS_STALE, CHANNELS_CACHE_KEY, SESSION_TOKEN_EXPIRY, PLAY_TOKEN_EXPIRY, TOKEN_RENEW_MARGIN, LOCATION_EXPIRY, LOCATION_CACHE_KEY, LOCATION_SERVED_KEY
 from .language import _
 
 class APIError(Error):
     pass
 
+class TokenError(APIError):
+    pass
+
+def _token_expires(token, default):
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(str(payload)))['exp'])
+    except:
+        return int(time.time() + default)
+
+location_stats = {'hits': 0, 'misses': 0}
+
 class API(object):
     def new_session(self):
         self.logged_in = False
-        self._session = Session(HEADERS)
+        self._session = session.get('skygo', HEADERS, pool_sizes={EPG_HOST: settings.getInt('epg_threads', 4)})
         self._set_authentication()
 
     def _set_authentication(self):
@@ -28,10 +44,15 @@ class API(object):
         self._session.headers.update({'sky-x-access-token': token})
         self.logged_in = True
 
+    @cache.cached(SERIES_EXPIRY, stale_ttl=SERIES_STALE)
     def series(self, id):
         return self._session.get(CONTENT_URL + id).json()
 
+    @cache.cached(CONTENT_EXPIRY, stale_ttl=CONTENT_STALE)
     def content(self, section='', sortby='TITLE', text='', title=None, channels='', start=0):
+        return self._content(section, sortby, text, title, channels, start)
+
+    def _content(self, section='', sortby='TITLE', text='', title=None, channels='', start=0):
         params = {
             'title': title or '',
             'genre': '',
@@ -42,16 +63,64 @@ class API(object):
             'type': '',
             'channel': channels,
             'section': section,
-            'size': 100,
+            'size': CONTENT_PAGE_SIZE,
             'start': start,
         }
 
         return self._session.get(CONTENT_URL, params=params).json()
 
-    def channels(self):
-        data = self._session.get(CHANNELS_URL).json()
-        return data['entries']
+    # also crawled by the service prewarm
+    @cache.cached(CONTENT_EXPIRY, stale_ttl=CONTENT_STALE, shared=True)
+    def content_all(self, **kwargs):
+        data   = self._content(**kwargs)
+        starts = range(data['index'], data['available'], CONTENT_PAGE_SIZE)
+
+        with threads.Pool(name='Content') as pool:
+            for page in pool.imap(lambda start: self._content(start=start, **kwargs), starts):
+                data['data'].extend(page['data'])
+
+        data['index'] = data['available']
+        return data
+
+    def channels(self, order='live', refresh=False):
+        catalogue, fresh = cache.get_stale(CHANNELS_CACHE_KEY)
+        if not refresh and catalogue:
+            if not fresh:
+                cache.revalidate('channels', CHANNELS_CACHE_KEY, self.channels, refresh=True)
+            return catalogue[order]
+
+        # the service prewarm and the plugin refresh it at the same time
+        catalogue = cache.fill(CHANNELS_CACHE_KEY, lambda: self._fetch_channels(catalogue), shared=True)
+        return catalogue[order]
         
+    def _fetch_channels(self, catalogue):
+        headers = {}
+        if catalogue and catalogue.get('etag'):
+            headers['If-None-Match'] = catalogue['etag']
+        if catalogue and catalogue.get('last_modified'):
+            headers['If-Modified-Since'] = catalogue['last_modified']
+
+        resp = self._session.get(CHANNELS_URL, headers=headers)
+
+        if resp.status_code == 304 and catalogue:
+            log('Channels: Not Modified')
+        else:
+            entries = resp.json()['entries']
+            catalogue = {
+                'live':  sorted(entries, key=lambda row: float(row.get('sky$liveChannelOrder', 'inf'))),
+                'title': sorted(entries, key=lambda row: row['title']),
+            }
+
+        # a 304 may leave out validators, keep the ones we have
+        catalogue.update({
+            'etag':          resp.headers.get('ETag') or catalogue.get('etag'),
+            'last_modified': resp.headers.get('Last-Modified') or catalogue.get('last_modified'),
+        })
+
+        cache.set(CHANNELS_CACHE_KEY, catalogue, CHANNELS_EXPIRY, CHANNELS_STALE)
+
+        return catalogue
+
     def login(self, username, password):
         device_id = hashlib.md5(username).hexdigest()
 
@@ -68,17 +137,30 @@ class API(object):
         if resp.status_code != 200 or 'sessiontoken' not in data:
             raise APIError(_(_.LOGIN_ERROR, message=data.get('message')))
 
-        userdata.set('access_token', data['sessiontoken'])
-        userdata.set('device_id', device_id)
+        with userdata.batch():
+            self._set_session_token(data['sessiontoken'])
+            userdata.set('device_id', device_id)
+
+            if settings.getBool('save_password', False):
+                userdata.set('pswd', password)
 
-        if settings.getBool('save_password', False):
-            userdata.set('pswd', password)
+            userdata.set('profile_id', data['profileId'])
 
         self._set_authentication()
+        self.refresh_subscriptions()
 
-        data = self._session.get(SUBSCRIPTIONS_URL.format(data['profileId'])).json()
+    def refresh_subscriptions(self):
+        profile_id = userdata.get('profile_id')
+        if not profile_id:
+            return
+
+        data = self._session.get(SUBSCRIPTIONS_URL.format(profile_id)).json()
         userdata.set('subscriptions', data['onlineSubscriptions'])
 
+    def refresh_play_token(self):
+        self._get_play_token(refresh=True)
+        return userdata.get('play_token_expires')
+
     def _renew_token(self):
         password = userdata.get('pswd')
 
@@ -98,12 +180,24 @@ class API(object):
         if resp.status_code != 200 or 'sessiontoken' not in data:
             raise APIError(_(_.RENEW_TOKEN_ERROR, message=data.get('message')))
 
-        userdata.set('access_token', data['sessiontoken'])
-
+        self._set_session_token(data['sessiontoken'])
         self._set_authentication()
 
-    def _get_play_token(self):
-        self._renew_token()
+    def _set_session_token(self, token):
+        with userdata.batch():
+            userdata.set('access_token', token)
+            userdata.set('token_expires', _token_expires(token, SESSION_TOKEN_EXPIRY))
+            userdata.delete('play_token')
+
+    # force renews the session token, refresh only fetches a new play token
+    def _get_play_token(self, force=False, refresh=False):
+        now = time.time()
+
+        if not force and not refresh and userdata.get('play_token') and userdata.get('play_token_expires', 0) - TOKEN_RENEW_MARGIN > now:
+            return userdata.get('play_token')
+
+        if force or userdata.get('token_expires', 0) - TOKEN_RENEW_MARGIN <= now:
+            self._renew_token()
 
         params = {
             'profileId':   userdata.get('device_id'),
@@ -115,14 +209,26 @@ class API(object):
         resp = self._session.get(TOKEN_URL, params=params)
         data = resp.json()
 
+        if resp.status_code in (401, 403) and not force:
+            return self._get_play_token(force=True)
+
         if resp.status_code != 200 or 'token' not in data:
             raise APIError(_(_.TOKEN_ERROR, message=data.get('message')))
 
+        with userdata.batch():
+            userdata.set('play_token', data['token'])
+            userdata.set('play_token_expires', int(now + PLAY_TOKEN_EXPIRY))
+
         return data['token']
 
-    def play_media(self, id):
-        token = self._get_play_token()
+    def _with_play_token(self, func):
+        try:
+            return func(self._get_play_token())
+        except TokenError:
+            log('Play token rejected. Renewing')
+            return func(self._get_play_token(force=True))
 
+    def play_media(self, id):
         params = {
             'form': 'json',
             'types': None,
@@ -140,17 +246,21 @@ class API(object):
                 chosen = video
                 break
  
-        url     = '{}&auth={}&formats=mpeg-dash&tracking=true'.format(chosen['plfile$url'], token)
-        pid     = chosen['plfile$url'].split('?')[0].split('/')[-1]
-        license = WIDEVINE_URL.format(token=token, pid=pid, challenge='B{SSM}')
+        pid = chosen['plfile$url'].split('?')[0].split('/')[-1]
 
-        url = self._get_location(url)
+        def _play(token):
+            url     = '{}&auth={}&formats=mpeg-dash&tracking=true'.format(chosen['plfile$url'], token)
+            license = WIDEVINE_URL.format(token=token, pid=pid, challenge='B{SSM}')
+            return self._get_location(url), license
 
-        return url, license
+        return self._with_play_token(_play)
 
     def _get_location(self, url):
         resp = self._session.get(url, allow_redirects=False)
 
+        if resp.status_code in (401, 403):
+            raise TokenError(_(_.PLAY_ERROR, message=resp.status_code))
+
         if resp.status_code != 302:
             data = resp.json()
             raise APIError(_(_.PLAY_ERROR, message=data.get('description')))
@@ -162,13 +272,34 @@ class API(object):
         return url
 
     def play_channel(self, id):
-        token = self._get_play_token()
-        url = PLAY_CHANNEL_URL.format(id=id, auth=token)
+        return self._with_play_token(lambda token: self._channel_location(id, token))
+
+    def _channel_location(self, id, token):
+        key = LOCATION_CACHE_KEY.format(id=id, token=hash_6(token))
 
-        url = self._get_location(url)
+        url = mem_cache.get(key)
+        if url:
+            location_stats['hits'] += 1
+        else:
+            location_stats['misses'] += 1
+            url = self._get_location(PLAY_CHANNEL_URL.format(id=id, auth=token))
+            mem_cache.set(key, url, LOCATION_EXPIRY)
+
+        # remember the key actually served so a failed start can drop it
+        mem_cache.set(LOCATION_SERVED_KEY.format(id=id), key, LOCATION_EXPIRY)
+        log('Channel Location: {hits} hits / {misses} misses'.format(**location_stats))
 
         return url
 
+    def invalidate_channel(self, id):
+        served = LOCATION_SERVED_KEY.format(id=id)
+
+        key = mem_cache.get(served)
+        if key:
+            log('Channel Location: Invalidating {}'.format(key))
+            mem_cache.delete(key)
+            mem_cache.delete(served)
+
     def epg(self, ids, start=None, end=None):
         start = start or arrow.utcnow()
         end   = end   or start.shift(days=1)
@@ -181,9 +312,26 @@ class API(object):
 
         return self._session.get(EPG_URL, params=params).json()['events']
 
+    def epg_windows(self, windows, chunksize=EPG_CHUNK_SIZE, workers=None, progress=None):
+        jobs = []
+        for start, ids in windows:
+            chunks = [ids[i:i+chunksize] for i in range(0, len(ids), chunksize)] if chunksize else [ids]
+            jobs.extend((start, chunk) for chunk in chunks)
+
+        workers = workers or settings.getInt('epg_threads', 4)
+
+        with threads.Pool(workers, name='EPG') as pool:
+            for job, events in zip(jobs, pool.imap(lambda job: self.epg(job[1], start=job[0]), jobs, progress=progress)):
+                yield job[0], job[1], events
+
     def logout(self):
-        userdata.delete('device_id')
-        userdata.delete('access_token')
-        userdata.delete('pswd')
-        userdata.delete('subscriptions')
+        with userdata.batch():
+            userdata.delete('device_id')
+            userdata.delete('access_token')
+            userdata.delete('pswd')
+            userdata.delete('subscriptions')
+            userdata.delete('profile_id')
+            userdata.delete('token_expires')
+            userdata.delete('play_token')
+            userdata.delete('play_token_expires')
         self.new_session()
\ No newline at end of file
@@ -7,14 +7,47 @@ HEADERS = {
 }
 
 DEVICE_IP    = '192.168.1.1'
+SESSION_TOKEN_EXPIRY = (60*60)   # 1 Hour (if token has no exp claim)
+PLAY_TOKEN_EXPIRY    = (60*60)   # 1 Hour
+TOKEN_RENEW_MARGIN   = (60*5)    # 5 Minutes
 CHANNELS_URL = 'https://feed.theplatform.com/f/7tMqSC/O5wnnwnQqDWV?form=json'
+CHANNELS_EXPIRY    = (60*60) # 1 Hour
+CHANNELS_CACHE_KEY = 'channels'
+CHANNELS_STALE     = (60*60*24) # 24 Hours
 AUTH_URL     = 'https://4azub3wqb8.execute-api.ap-southeast-2.amazonaws.com/prod/auth/skygo/token/v1/authenticate/'
 TOKEN_URL    = 'https://6cwj6qmdoa.execute-api.ap-southeast-2.amazonaws.com/prod/v1/token/mpx/'
 RENEW_URL    = 'https://4azub3wqb8.execute-api.ap-southeast-2.amazonaws.com/prod/auth/skygo/token/v1/renew'
 CONTENT_URL  = 'https://www.skygo.co.nz/pub-api/content/v1/'
+CONTENT_PAGE_SIZE = 100
+CONTENT_EXPIRY    = (60*60) # 1 Hour
+CONTENT_STALE     = (60*60*6) # 6 Hours
+TITLE_INDEX_EXPIRY  = (60*60*24) # 24 Hours (full rebuild)
+TITLE_INDEX_REFRESH = (60*60)    # 1 Hour (merge LATEST)
+SERIES_EXPIRY         = (60*60*6) # 6 Hours
+SERIES_STALE          = (60*60*24) # 24 Hours
+SERIES_PREFETCH_MAX   = 8
+SERIES_PREFETCH_THREADS = 4
+SEARCH_SECTIONS = ['tvshows', 'movies', 'sport', 'boxsets']
+SEARCH_LIMIT    = 200
 IMAGE_URL    = 'https://prod-images.skygo.co.nz/{}'
 PLAY_URL     = 'https://feed.theplatform.com/f/7tMqSC/T2XJ65T_soBz'
 PLAY_CHANNEL_URL  = 'https://link.theplatform.com/s/7tMqSC/media/{id}?feed=SkyGo&auth={auth}'
+LOCATION_EXPIRY    = (60*2) # 2 Minutes
+LOCATION_CACHE_KEY = 'channel_location.{id}.{token}'
+LOCATION_SERVED_KEY = 'channel_location_served.{id}'
+SUBSCRIPTIONS_EXPIRY = (60*60*24) # 24 Hours
 SUBSCRIPTIONS_URL = 'https://z4a6uom8wa.execute-api.ap-southeast-2.amazonaws.com/prod/v2/onlineSubscriptions/?profileId={}'
-EPG_URL = 'https://www.sky.co.nz/search-service/rest/events'
-WIDEVINE_URL = 'https://widevine.entitlement.theplatform.com/wv/web/ModularDrm/getWidevineLicense?schema=1.0&token={token}&form=json&account=http://access.auth.theplatform.com/data/Account/2682481291&_releasePid={pid}&_widevineChallenge={challenge}'
\ No newline at end of file
+EPG_HOST = 'www.sky.co.nz'
+EPG_URL = 'https://{}/search-service/rest/events'.format(EPG_HOST)
+EPG_CHUNK_SIZE = 0 # channels per EPG request (0 = all)
+EPG_EXPIRY       = (60*60*12) # 12 Hours
+EPG_EXPIRY_TODAY = (60*60*2)  # 2 Hours
+EPG_LEASE_KEY    = 'epg_refresh'
+WIDEVINE_URL = 'https://widevine.entitlement.theplatform.com/wv/web/ModularDrm/getWidevineLicense?schema=1.0&token={token}&form=json&account=http://access.auth.theplatform.com/data/Account/2682481291&_releasePid={pid}&_widevineChallenge={challenge}'
+
+PREWARM_KEY       = 'prewarm'
+PREWARM_RATIO     = 0.8        # refresh after 80% of an items lifetime
+PREWARM_MIN       = (60*5)     # 5 Minutes
+PREWARM_RETRY     = (60*5)     # 5 Minutes (doubles on each failure)
+PREWARM_MAX_RETRY = (60*60*2)  # 2 Hours
+PREWARM_EPG_HOURS = 4
@@ -26,5 +26,8 @@ class Language(BaseLanguage):
     ALL                    = 30022
     ZERO_9                 = 30023
     CHANNELS               = 30024
+    EPG_THREADS            = 30025
+    LOAD_ALL               = 30026
+    LETTER_COUNT           = 30027
 
 _ = Language()
\ No newline at end of file
@@ -1,13 +1,21 @@
-from time import time
+import os
+import threading
+from time import time, sleep
 from functools import wraps
+from contextlib import contextmanager
 
-from . import peewee, database, settings, signals, gui, router
-from .constants import CACHE_TABLENAME, CACHE_EXPIRY, CACHE_CHECKSUM, CACHE_CLEAN_INTERVAL, CACHE_CLEAN_KEY, ROUTE_CLEAR_CACHE
-from .util import hash_6
+from . import peewee, database, settings, signals, gui, router, threads
+from .constants import CACHE_TABLENAME, CACHE_EXPIRY, CACHE_CHECKSUM, CACHE_CLEAN_INTERVAL, CACHE_CLEAN_KEY, ROUTE_CLEAR_CACHE, CACHE_LEASE_TABLENAME, CACHE_LEASE_TIMEOUT, CACHE_LEASE_POLL, CACHE_LEASE_WAIT, CACHE_REFRESH_WORKERS, CACHE_REFRESH_WAIT
+from .util import cache_key
 from .log import log
 from .language import _
 
-funcs   = []
+funcs    = []
+stats    = {}
+_flights = threads.SingleFlight()
+_refresh = threads.Pool(CACHE_REFRESH_WORKERS, name='Cache Refresh')
+_pending = set()
+_lock    = threading.Lock()
 
 class Cache(database.Model):
     checksum = CACHE_CHECKSUM
@@ -15,10 +23,19 @@ class Cache(database.Model):
     key     = database.HashField(unique=True)
     value   = database.PickledField()
     expires = peewee.IntegerField()
+    stale   = peewee.IntegerField(index=True)
 
     class Meta:
         table_name = CACHE_TABLENAME
 
+class Lease(database.Model):
+    key     = peewee.TextField(unique=True)
+    owner   = peewee.TextField()
+    expires = peewee.IntegerField()
+
+    class Meta:
+        table_name = CACHE_LEASE_TABLENAME
+
 def enabled():
     return settings.getBool('use_cache', True)
 
@@ -27,50 +44,144 @@ def key_for(f, *args, **kwargs):
     if not enabled() or func_name not in funcs:
         return None
 
-    return _build_key(func_name, *args, **kwargs)
-
-def _build_key(func_name, *args, **kwargs):
-    key = func_name
-
-    def to_str(item):
-        try:
-            return item.encode('utf-8')
-        except:
-            return str(item)
-    
-    for k in sorted(args):
-        key += to_str(k)
-
-    for k in sorted(kwargs):
-        key += to_str(k) + to_str(kwargs[k])
+    # a bound method's instance is the first argument of the cached call
+    if getattr(f, '__self__', None) is not None:
+        args = (f.__self__,) + args
 
-    return hash_6(key)
+    return cache_key(func_name, *args, **kwargs)
 
 def cached(*args, **kwargs):
-    def decorator(f, expires=CACHE_EXPIRY, key=None):
+    # shared=True for keys the service and plugin processes both fill
+    def decorator(f, expires=CACHE_EXPIRY, key=None, stale_ttl=0, shared=False):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            _key = key or _build_key(f.__name__, *args, **kwargs)
+            _key = key or cache_key(f.__name__, *args, **kwargs)
             if callable(_key):
                 _key = _key(*args, **kwargs)
 
+            _stats = _func_stats(f.__name__)
+
+            def _fill():
+                value = f(*args, **kwargs)
+                if value != None:
+                    size = set(_key, value, expires, stale_ttl)
+                    _stats['bytes'] += size
+                    log('Cache Set: {} ({} bytes)'.format(_key, size))
+
+                return value
+
+            def _compute():
+                return fill(_key, _fill, shared)
+
             if not kwargs.pop('_skip_cache', False):
-                value = get(_key)
+                value, fresh = get_stale(_key) if stale_ttl else (get(_key), True)
                 if value != None:
-                    log('Cache Hit: {}'.format(_key))
+                    if fresh:
+                        _stats['hits'] += 1
+                        log('Cache Hit: {} ({})'.format(_key, hit_rate(f.__name__)))
+                    else:
+                        revalidate(f.__name__, _key, _compute)
                     return value
 
-            value = f(*args, **kwargs)
-            if value != None:
-                set(_key, value, expires)
+            _stats['misses'] += 1
 
-            return value
+            return _compute()
 
         funcs.append(f.__name__)
         return decorated_function
 
     return lambda f: decorator(f, *args, **kwargs)
 
+# one caller per process runs func, shared keys also take the lease so only one process does
+def fill(key, func, shared=False):
+    def _compute():
+        if not shared:
+            return func()
+
+        with lease(key) as acquired:
+            if not acquired:
+                value = wait(key)
+                if value != None:
+                    return value
+
+            return func()
+
+    return _flights.do(key, _compute)
+
+def _func_stats(name):
+    return stats.setdefault(name, {'hits': 0, 'misses': 0, 'stale': 0, 'bytes': 0, 'stale_served': None})
+
+def revalidate(name, key, func, *args, **kwargs):
+    _stats = _func_stats(name)
+    _stats['stale'] += 1
+    _stats['stale_served'] = time()
+    log('Cache Stale: {} ({} stale served)'.format(key, _stats['stale']))
+
+    with _lock:
+        if key in _pending:
+            return
+
+        _pending.add(key)
+
+    def _run():
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            log.debug('Cache: Refresh {} failed: {}'.format(key, e))
+        finally:
+            with _lock:
+                _pending.discard(key)
+
+            database.close()
+
+    _refresh.submit(_run)
+
+# give quick refreshes a chance to finish, but don't hold up the dispatch for slow ones
+@signals.on(signals.AFTER_DISPATCH)
+def _join_refresh():
+    if _refresh.join(CACHE_REFRESH_WAIT):
+        _refresh.close()
+    else:
+        log.debug('Cache: Leaving {} refreshes running'.format(len(_pending)))
+
+def hit_rate(func_name):
+    _stats = stats.get(func_name)
+    if not _stats or not (_stats['hits'] + _stats['misses']):
+        return '0%'
+
+    return '{:.0f}%'.format(100.0 * _stats['hits'] / (_stats['hits'] + _stats['misses']))
+
+@contextmanager
+def lease(key, timeout=CACHE_LEASE_TIMEOUT):
+    if not enabled():
+        yield True
+        return
+
+    owner = '{}.{}.{}'.format(os.getpid(), threading.current_thread().ident, time())
+
+    Lease.delete_where(Lease.key == key, Lease.expires < int(time()))
+    Lease.insert(key=key, owner=owner, expires=int(time() + timeout)).on_conflict_ignore().execute()
+    acquired = Lease.exists_or_false(Lease.key == key, Lease.owner == owner)
+
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            Lease.delete_where(Lease.key == key, Lease.owner == owner)
+
+def wait(key, default=None, timeout=CACHE_LEASE_WAIT):
+    log.debug('Cache: Waiting on lease {}'.format(key))
+
+    give_up = time() + timeout
+    while time() < give_up and Lease.exists_or_false(Lease.key == key, Lease.expires >= int(time())):
+        sleep(CACHE_LEASE_POLL)
+
+        value = get(key)
+        if value != None:
+            return value
+
+    return get(key, default)
+
 def get(key, default=None):
     if not enabled():
         return default
@@ -79,10 +190,31 @@ def get(key, default=None):
         return Cache.get(Cache.key == key, Cache.expires > time()).value
     except Cache.DoesNotExist:
         return default
+    except database.DecodeError as e:
+        log.debug('Cache: {} unreadable: {}'.format(key, e))
+        return default
+
+def get_stale(key, default=None):
+    if not enabled():
+        return default, True
+
+    now = time()
+
+    try:
+        row = Cache.get(Cache.key == key, Cache.stale > now)
+    except Cache.DoesNotExist:
+        return default, True
+    except database.DecodeError as e:
+        log.debug('Cache: {} unreadable: {}'.format(key, e))
+        return default, True
+
+    return row.value, row.expires > now
 
-def set(key, value, expires=CACHE_EXPIRY):
+def set(key, value, expires=CACHE_EXPIRY, stale_ttl=0):
     expires = int(time() + expires)
-    Cache.set(key=key, value=value, expires=expires)
+    data    = Cache.value.encode(value)
+    Cache.set(key=key, value=data, expires=expires, stale=expires + int(stale_ttl))
+    return len(data)
 
 def delete(key):
     return Cache.delete_where(Cache.key == key)
@@ -91,9 +223,21 @@ def empty():
     deleted = Cache.truncate()
     log('Cache: Deleted {} Rows'.format(deleted))
 
+@signals.on(signals.ON_SERVICE)
 @signals.on(signals.BEFORE_DISPATCH)
-def remove_expired():
-    deleted = Cache.delete_where(Cache.expires < int(time()))
+def remove_expired(force=False):
+    now = int(time())
+
+    try:
+        last_clean = int(database.KeyStore.get(database.KeyStore.key == CACHE_CLEAN_KEY).value)
+    except database.KeyStore.DoesNotExist:
+        last_clean = 0
+
+    if not force and now - last_clean < CACHE_CLEAN_INTERVAL:
+        return
+
+    deleted = Cache.delete_where(Cache.stale < now)
+    database.KeyStore.set(key=CACHE_CLEAN_KEY, value=now)
     log('Cache: Deleted {} Expired Rows'.format(deleted))
 
 @router.route(ROUTE_CLEAR_CACHE)
@@ -102,4 +246,4 @@ def clear_cache(key, **kwargs):
     msg = _(_.PLUGIN_CACHE_REMOVED, delete_count=delete_count)
     gui.notification(msg)
 
-database.tables.append(Cache)
\ No newline at end of file
+database.tables.extend([Cache, Lease])
\ No newline at end of file
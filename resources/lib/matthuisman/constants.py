@@ -26,10 +26,14 @@ DB_PRAGMAS      = {
     'synchronous': 0
 }
 DB_TABLENAME = '_db'
+DB_COMPRESSION        = 'zlib' # None, zlib or lzma
+DB_COMPRESS_THRESHOLD = 1024   # bytes
+DB_COMPRESS_LEVEL     = 6
 ###################
 
 ##### USERDATA ####
-USERDATA_KEY = '_userdata'
+USERDATA_KEY       = '_userdata' # legacy setting, migrated to the database
+USERDATA_TABLENAME = '_userdata'
 ###############
 
 ##### CACHE #####
@@ -38,6 +42,14 @@ CACHE_CHECKSUM       = ADDON_VERSION # Recreates cache when new addon version
 CACHE_EXPIRY         = (60*60*24) # 24 Hours
 CACHE_CLEAN_INTERVAL = (60*60*4)  # 4 Hours
 CACHE_CLEAN_KEY      = '_cache_cleaned'
+CACHE_LEASE_TABLENAME = '_lease'
+CACHE_LEASE_TIMEOUT   = 30  # seconds a refresh may hold its key
+CACHE_LEASE_POLL      = 0.2 # seconds between checks while waiting
+CACHE_LEASE_WAIT      = 2   # seconds to wait on another process before fetching anyway
+CACHE_REFRESH_WORKERS = 2   # background refreshes of stale entries
+CACHE_REFRESH_WAIT    = 1   # seconds the end of a dispatch waits on them
+MEM_CACHE_MAX_SIZE   = (1024*1024*5) # 5MB of pickled values
+MEM_CACHE_RESIDENT   = True # keep values in-process between dispatches
 #################
 
 #### ROUTING ####
@@ -55,6 +67,7 @@ ROUTE_LIVE_SUFFIX      = '.pvr'
 ROUTE_URL_TAG          = '_url'
 FORCE_RUN_FLAG         = '_force_run'
 ROUTE_AUTOPLAY_TAG     = '_autoplay'
+ROUTE_FRAGMENT_CACHE   = 10000 # encoded url params kept per process
 #################
 
 #### INPUTSTREAM ADAPTIVE #####
@@ -63,6 +76,8 @@ IA_VERSION_KEY  = '_version'
 IA_HLS_MIN_VER  = 2
 IA_MPD_MIN_VER  = 2
 IA_MODULES_URL  = 'https://k.mjh.nz/.decryptmodules/modules.v2.json'
+IA_CAPS_KEY     = '_ia_caps'
+IA_CAPS_EXPIRY  = (60*60*24) # 24 Hours (also refreshed when the add-on version changes)
 ###################
 
 #### MISC #####
@@ -78,7 +93,27 @@ LOG_FORMAT = u'%(name)s - %(message)s'
 SESSION_TIMEOUT  = (5, 10)
 SESSION_ATTEMPTS = 2
 SESSION_CHUNKSIZE = 4096
+SESSION_POOL_HOSTS   = 10 # hosts kept in the connection pool
+SESSION_POOL_SIZE    = 4  # connections kept per host
+SESSION_IDLE_TIMEOUT = 60 # seconds before a pooled session is discarded
+SESSION_BACKOFF      = 0.5
+SESSION_MAX_BACKOFF  = 10
+SESSION_RETRY_STATUSES     = (429, 500, 502, 503, 504)
+SESSION_IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+SESSION_RETRY_BUDGET = 0.2 # retries allowed per request made
+SESSION_RETRY_MIN    = 3   # retries always allowed
+#################
+
+#### THREADS ####
+THREAD_WORKERS      = 4
+THREAD_IDLE_TIMEOUT = 2
+#################
+
+#### XMLTV ####
+XMLTV_CHUNKSIZE   = (1024*64)
+XMLTV_TIME_FORMAT = '%Y%m%d%H%M%S +0000'
 #################
 
 #### GUI ####
-GUI_DEFAULT_AUTOCLOSE = 120000 #2mins
\ No newline at end of file
+GUI_DEFAULT_AUTOCLOSE = 120000 #2mins
+GUI_BATCH_SIZE        = 200 # list items sent to Kodi per addDirectoryItems call
\ No newline at end of file
@@ -1,14 +1,23 @@
 import os
 import json
+import zlib
 
 try:
     import cPickle as pickle
 except:
     import pickle
 
-from . import peewee, userdata, signals
-from .constants import DB_PATH, DB_PRAGMAS, DB_MAX_INSERTS, DB_TABLENAME, ADDON_DEV
-from .util import hash_6
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+from . import peewee, signals
+from .constants import DB_PATH, DB_PRAGMAS, DB_MAX_INSERTS, DB_TABLENAME, ADDON_DEV, DB_COMPRESSION, DB_COMPRESS_THRESHOLD, DB_COMPRESS_LEVEL
+from .util import hash_6, hash_key
 
 path = os.path.dirname(DB_PATH)
 if not os.path.exists(path):
@@ -24,16 +33,67 @@ if ADDON_DEV:
 
 class HashField(peewee.TextField):
     def db_value(self, value):
-        return hash_6(value)
+        return hash_key(value)
+
+# First byte of an encoded value. Values without one are plain pickles from older versions
+CODEC_RAW  = '\x01'
+CODEC_ZLIB = '\x02'
+CODEC_LZMA = '\x03'
+
+def encode(value, compression=DB_COMPRESSION, threshold=DB_COMPRESS_THRESHOLD):
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    if compression and len(data) >= threshold:
+        if compression == 'lzma' and lzma:
+            return CODEC_LZMA + lzma.compress(data)
+        elif compression in ('zlib', 'lzma'):
+            return CODEC_ZLIB + zlib.compress(data, DB_COMPRESS_LEVEL)
+
+    return CODEC_RAW + data
+
+class DecodeError(ValueError):
+    pass
+
+def decode(data):
+    data   = str(data)
+    header = data[:1]
+
+    # written by a Kodi with lzma, read by one without
+    if header == CODEC_LZMA and not lzma:
+        raise DecodeError('lzma value but lzma module unavailable')
+
+    if header == CODEC_RAW:
+        return pickle.loads(data[1:])
+    elif header == CODEC_ZLIB:
+        return pickle.loads(zlib.decompress(data[1:]))
+    elif header == CODEC_LZMA:
+        return pickle.loads(lzma.decompress(data[1:]))
+    else:
+        return pickle.loads(data)
+
+# a value that has already been through encode()
+class Encoded(str):
+    pass
 
 class PickledField(peewee.BlobField):
+    def __init__(self, compression=DB_COMPRESSION, threshold=DB_COMPRESS_THRESHOLD, *args, **kwargs):
+        super(PickledField, self).__init__(*args, **kwargs)
+        self.compression = compression
+        self.threshold   = threshold
+
+    def encode(self, value):
+        return Encoded(encode(value, self.compression, self.threshold))
+
     def db_value(self, value):
         if value != None:
-            return super(PickledField, self).db_value(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+            if not isinstance(value, Encoded):
+                value = self.encode(value)
+
+            return super(PickledField, self).db_value(value)
 
     def python_value(self, value):
         if value != None:
-            return super(PickledField, self).python_value(pickle.loads(str(value)))
+            return decode(value)
 
 class JSONField(peewee.TextField):
     def db_value(self, value):
@@ -80,7 +140,7 @@ class Model(peewee.Model):
     def replace_many(cls, data):
         with db.atomic():
             for idx in range(0, len(data), DB_MAX_INSERTS):
-                super(Model, cls).replace_many(data[idx:idx+DB_MAX_INSERTS]).execute()
+                super(Model, cls).insert_many(data[idx:idx+DB_MAX_INSERTS]).on_conflict_replace().execute()
 
     @classmethod
     def insert_many(cls, data):
@@ -5,9 +5,9 @@ import shutil
 
 import xbmc, xbmcaddon
 
-from . import gui, settings
+from . import gui, settings, mem_cache
 from .log import log
-from .constants import IA_ADDON_ID, IA_VERSION_KEY, IA_HLS_MIN_VER, IA_MPD_MIN_VER, IA_MODULES_URL, SESSION_CHUNKSIZE, ADDON_DEV
+from .constants import IA_ADDON_ID, IA_VERSION_KEY, IA_HLS_MIN_VER, IA_MPD_MIN_VER, IA_MODULES_URL, IA_CAPS_KEY, IA_CAPS_EXPIRY, SESSION_CHUNKSIZE, ADDON_DEV
 from .language import _
 from .util import get_kodi_version, md5sum, remove_file
 from .exceptions import InputStreamError
@@ -57,18 +57,57 @@ class Widevine(InputstreamItem):
     def check(self):
         return install_widevine()
 
-def get_ia_addon(required=False):
+def _install_ia():
     try:
         xbmc.executebuiltin('InstallAddon({})'.format(IA_ADDON_ID), True)
         xbmc.executeJSONRPC('{{"jsonrpc":"2.0","id":1,"method":"Addons.SetAddonEnabled","params":{{"addonid":"{}","enabled":true}}}}'.format(IA_ADDON_ID))
         return xbmcaddon.Addon(IA_ADDON_ID)
     except:
-        pass
+        return None
+
+def _probe(addon_version):
+    ia_addon     = _install_ia()
+    system, arch = _get_system_arch()
+
+    caps = {
+        'addon_version': addon_version,
+        'installed':     ia_addon is not None,
+        'version':       ia_addon.getAddonInfo('version') if ia_addon else '',
+        'widevine':      ia_addon.getSetting(IA_VERSION_KEY) if ia_addon else '',
+        'system':        system,
+        'arch':          arch,
+        'kodi_version':  get_kodi_version(),
+        'android':       bool(xbmc.getCondVisibility('system.platform.android')),
+    }
+
+    log.debug('InputStream Capabilities: {}'.format(caps))
+    return caps
+
+def capabilities(refresh=False):
+    # cheap info label, changes when inputstream.adaptive is installed or updated
+    addon_version = xbmc.getInfoLabel('System.AddonVersion({})'.format(IA_ADDON_ID))
+
+    caps = mem_cache.get(IA_CAPS_KEY)
+    if refresh or not caps or caps['addon_version'] != addon_version:
+        caps = _probe(addon_version)
+        mem_cache.set(IA_CAPS_KEY, caps, IA_CAPS_EXPIRY)
+
+    return caps
 
-    if required:
+def get_ia_addon(required=False):
+    ia_addon = None
+
+    if capabilities()['installed']:
+        try: ia_addon = xbmcaddon.Addon(IA_ADDON_ID)
+        except: pass
+
+    if not ia_addon and required and capabilities(refresh=True)['installed']:
+        ia_addon = xbmcaddon.Addon(IA_ADDON_ID)
+
+    if not ia_addon and required:
         raise InputStreamError(_.IA_NOT_FOUND)
 
-    return None
+    return ia_addon
 
 def set_quality():
     ia_addon = get_ia_addon(required=True)
@@ -104,22 +143,23 @@ def open_settings():
     ia_addon.openSettings()
 
 def supports_hls():
-    ia_addon = get_ia_addon()
-    return bool(ia_addon and int(ia_addon.getAddonInfo('version')[0]) >= IA_HLS_MIN_VER)
+    caps = capabilities()
+    return bool(caps['installed'] and int(caps['version'][0]) >= IA_HLS_MIN_VER)
 
 def supports_mpd():
-    ia_addon = get_ia_addon()
-    return bool(ia_addon and int(ia_addon.getAddonInfo('version')[0]) >= IA_MPD_MIN_VER)
+    caps = capabilities()
+    return bool(caps['installed'] and int(caps['version'][0]) >= IA_MPD_MIN_VER)
 
 def supports_playready():
-    ia_addon = get_ia_addon()
-    return bool(ia_addon and get_kodi_version() > 17 and xbmc.getCondVisibility('system.platform.android'))
+    caps = capabilities()
+    return bool(caps['installed'] and caps['kodi_version'] > 17 and caps['android'])
 
 def install_widevine(reinstall=False):
     ia_addon     = get_ia_addon(required=True)
-    system, arch = _get_system_arch()
-    kodi_version = get_kodi_version()
-    ver_slug     = system + arch + str(kodi_version) + ia_addon.getAddonInfo('version')
+    caps         = capabilities()
+    system, arch = caps['system'], caps['arch']
+    kodi_version = caps['kodi_version']
+    ver_slug     = system + arch + str(kodi_version) + caps['version']
 
     if kodi_version < 18:
         raise InputStreamError(_(_.IA_KODI18_REQUIRED, system=system))
@@ -133,12 +173,18 @@ def install_widevine(reinstall=False):
     elif 'aarch64' in arch:
         raise InputStreamError(_.IA_AARCH64_ERROR)
 
+    elif not reinstall and ver_slug == caps['widevine']:
+        return True
+
     elif not reinstall and ver_slug == ia_addon.getSetting(IA_VERSION_KEY):
+        caps['widevine'] = ver_slug
+        mem_cache.set(IA_CAPS_KEY, caps, IA_CAPS_EXPIRY)
         return True
 
     ## DO INSTALL ##
 
     ia_addon.setSetting(IA_VERSION_KEY, '')
+    mem_cache.delete(IA_CAPS_KEY)
 
     from .session import Session
 
@@ -163,6 +209,9 @@ def install_widevine(reinstall=False):
         return False
 
     ia_addon.setSetting(IA_VERSION_KEY, ver_slug)
+    caps['widevine'] = ver_slug
+    mem_cache.set(IA_CAPS_KEY, caps, IA_CAPS_EXPIRY)
+
     gui.ok(_.IA_WV_INSTALL_OK)
 
     return True
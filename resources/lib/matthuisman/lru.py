@@ -0,0 +1,108 @@
+import sys
+import heapq
+from time import time
+from collections import OrderedDict
+
+from .constants import CACHE_EXPIRY, MEM_CACHE_MAX_SIZE
+
+def approx_size(obj, _depth=0):
+    size = sys.getsizeof(obj)
+    if _depth > 4:
+        return size
+
+    if isinstance(obj, dict):
+        for key, value in obj.iteritems():
+            size += approx_size(key, _depth+1) + approx_size(value, _depth+1)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for value in obj:
+            size += approx_size(value, _depth+1)
+
+    return size
+
+class LRUCache(object):
+    def __init__(self, max_size=MEM_CACHE_MAX_SIZE, on_evict=None):
+        self.max_size  = max_size
+        self.size      = 0
+        self.stats     = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+        self._on_evict = on_evict
+        self._data     = OrderedDict() # key -> [value, expires, size]
+        self._heap     = []            # (expires, key)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(self._data.keys())
+
+    def row(self, key):
+        return self._data.get(key)
+
+    def get(self, key, default=None):
+        try:
+            row = self._data.pop(key)
+        except KeyError:
+            self.stats['misses'] += 1
+            return default
+
+        if row[1] < time():
+            self.size -= row[2]
+            self.stats['expired'] += 1
+            self.stats['misses'] += 1
+            return default
+
+        self._data[key] = row
+        self.stats['hits'] += 1
+        return row[0]
+
+    def set(self, key, value, expires=CACHE_EXPIRY, size=None):
+        self.delete(key)
+
+        expires = int(time() + expires)
+        size    = size or approx_size(value)
+
+        self._data[key] = [value, expires, size]
+        self.size += size
+        heapq.heappush(self._heap, (expires, key))
+
+        if len(self._heap) > 2 * len(self._data) + 64:
+            self._heap = [(row[1], _key) for _key, row in self._data.iteritems()]
+            heapq.heapify(self._heap)
+
+        while self.size > self.max_size and len(self._data) > 1:
+            key, row = self._data.popitem(last=False)
+            self.size -= row[2]
+            self.stats['evictions'] += 1
+
+            if self._on_evict:
+                self._on_evict(key, row[0], row[1])
+
+    def delete(self, key):
+        row = self._data.pop(key, None)
+        if row is None:
+            return False
+
+        self.size -= row[2]
+        return True
+
+    def expire(self):
+        now     = time()
+        expired = []
+
+        while self._heap and self._heap[0][0] < now:
+            expires, key = heapq.heappop(self._heap)
+
+            row = self._data.get(key)
+            if row and row[1] == expires:
+                self.delete(key)
+                expired.append(key)
+
+        self.stats['expired'] += len(expired)
+        return expired
+
+    def clear(self):
+        self._data.clear()
+        self._heap = []
+        self.size  = 0
@@ -1,4 +1,5 @@
 import sys
+import heapq
 from time import time
 from functools import wraps
 
@@ -10,128 +11,240 @@ except:
 import xbmcgui
 
 from .log import log
-from .util import hash_6
-from .constants import ADDON_ID, CACHE_EXPIRY, ROUTE_CLEAR_CACHE
-from . import signals, gui, router, settings
+from .constants import ADDON_ID, CACHE_EXPIRY, ROUTE_CLEAR_CACHE, MEM_CACHE_MAX_SIZE, MEM_CACHE_RESIDENT, NOARG
+from .lru import LRUCache
+from . import signals, gui, router, settings, threads, util
 
 cache_key = 'cache.'+ADDON_ID
+funcs     = []
+_flights  = threads.SingleFlight()
 _window   = xbmcgui.Window(10000)
 
+def _on_evict(key, value, expires):
+    # keep evicted but unsaved values in the window
+    if key in cache.dirty and settings.getBool('persist_cache', True):
+        _write(key, value, expires)
+        cache.dirty.discard(key)
+
 class Cache(object):
-    data = {}
+    data     = LRUCache(MEM_CACHE_MAX_SIZE, on_evict=_on_evict)
+    index    = {} # key -> [expires, size, accessed]
+    expiries = [] # (expires, key) heap over index
+    size     = 0  # saved bytes of index
+    dirty    = set()
+    deleted  = set()
+    changed  = False
+    gen      = None
 
 cache = Cache()
 
+def _prop(key):
+    return '{}.{}'.format(cache_key, key)
+
+def _write(key, value, expires):
+    data = pickle.dumps([value, expires])
+    _window.setProperty(_prop(key), data)
+
+    if key in cache.index:
+        cache.size += len(data) - cache.index[key][1]
+        cache.index[key][1] = len(data)
+
 @signals.on(signals.BEFORE_DISPATCH)
 def load():
-    if not cache.data and settings.getBool('persist_cache', True):
-        cache.data = {}
+    if not settings.getBool('persist_cache', True):
+        return
+
+    gen = _window.getProperty(_prop('_gen'))
+    if cache.gen is not None and gen == cache.gen:
+        return
+
+    cache.data.clear()
+    cache.dirty.clear()
+    cache.deleted.clear()
+    cache.changed = False
+    cache.gen     = gen
 
-        data = _window.getProperty(cache_key)
-        
-        if data:
-            try:
-                cache.data = pickle.loads(data)
-            except:
-                pass
+    try:
+        cache.index = pickle.loads(_window.getProperty(_prop('_index')))
+    except:
+        cache.index = {}
+        # whole-cache pickle from older versions
+        _window.clearProperty(cache_key)
 
-        _window.setProperty(cache_key, "{}")
+    cache.expiries = [(row[0], key) for key, row in cache.index.iteritems()]
+    heapq.heapify(cache.expiries)
+    cache.size = sum(row[1] for row in cache.index.itervalues())
 
 def set(key, value, expires=CACHE_EXPIRY):
-    expires = int(time() + expires)
-    cache.data[key] = [value, expires]
-    
+    row = cache.index.get(key)
+    if row:
+        cache.size -= row[1]
+
+    row = cache.index[key] = [int(time() + expires), 0, time()]
+    heapq.heappush(cache.expiries, (row[0], key))
+
+    if len(cache.expiries) > 2 * len(cache.index) + 64:
+        cache.expiries = [(_row[0], _key) for _key, _row in cache.index.iteritems()]
+        heapq.heapify(cache.expiries)
+
+    cache.dirty.add(key)
+    cache.deleted.discard(key)
+    cache.changed = True
+    cache.data.set(key, value, expires)
+
 def get(key, default=None):
-    try:
-        row = cache.data[key]
-    except KeyError:
-        return default
+    if key not in cache.data:
+        if key not in cache.index:
+            cache.data.stats['misses'] += 1
+            return default
+
+        try:
+            value, expires = pickle.loads(_window.getProperty(_prop(key)))
+        except:
+            delete(key)
+            return default
+
+        cache.data.set(key, value, expires - time(), size=cache.index[key][1] or None)
 
-    if row[1] < time():
-        cache.data.pop(key, None)
+    value = cache.data.get(key, NOARG)
+    if value is NOARG:
+        delete(key)
         return default
-    else:
-        return row[0]
+
+    # access time only matters to this process' eviction, it's saved along with the next real change
+    if key in cache.index:
+        cache.index[key][2] = time()
+
+    return value
 
 def delete(key):
-    return int(cache.data.pop(key, None) != None)
+    existed = cache.data.delete(key) or key in cache.index
+
+    row = cache.index.pop(key, None)
+    if row:
+        cache.size -= row[1]
+
+    cache.dirty.discard(key)
+    cache.deleted.add(key)
+    cache.changed = True
+
+    return int(existed)
 
 def empty():
-    deleted = len(cache.data)
-    cache.data.clear()
-    log('Mem Cache: Deleted {} Rows'.format(deleted))
+    keys = list(cache.index) + [key for key in cache.data if key not in cache.index]
+    for key in keys:
+        delete(key)
 
-def key_for(f, *args, **kwargs):
-    func_name = f.__name__ if callable(f) else f
-    if not enabled() or func_name not in funcs:
-        return None
+    log('Mem Cache: Deleted {} Rows'.format(len(keys)))
 
-    return _build_key(func_name, *args, **kwargs)
+def save():
+    if not cache.changed:
+        return
 
-def _build_key(func_name, *args, **kwargs):
-    key = func_name
+    for key in cache.dirty:
+        row = cache.data.row(key)
+        if row:
+            _write(key, row[0], row[1])
 
-    def to_str(item):
-        try:
-            return item.encode('utf-8')
-        except:
-            return str(item)
+    _evict()
 
-    def is_primitive(item):
-        return type(item) in (int, str, dict, list, bool, float, unicode)
-    
-    for k in sorted(args):
-        if is_primitive(k):
-            key += to_str(k)
+    for key in cache.deleted:
+        _window.clearProperty(_prop(key))
 
-    for k in sorted(kwargs):
-        if is_primitive(kwargs[k]):
-            key += to_str(k) + to_str(kwargs[k])
+    log.debug('Mem Cache: Saved {} / Removed {} Rows'.format(len(cache.dirty), len(cache.deleted)))
 
-    return hash_6(key)
+    cache.gen = str(time())
+    _window.setProperty(_prop('_index'), pickle.dumps(cache.index))
+    _window.setProperty(_prop('_gen'), cache.gen)
+
+    cache.dirty.clear()
+    cache.deleted.clear()
+    cache.changed = False
+
+def _evict():
+    if cache.size <= MEM_CACHE_MAX_SIZE:
+        return
+
+    count = 0
+    for key in sorted(cache.index, key=lambda key: cache.index[key][2]):
+        delete(key)
+        count += 1
+
+        if cache.size <= MEM_CACHE_MAX_SIZE:
+            break
+
+    log('Mem Cache: Evicted {} Rows'.format(count))
+
+def key_for(f, *args, **kwargs):
+    func_name = f.__name__ if callable(f) else f
+    if func_name not in funcs:
+        return None
+
+    # a bound method's instance is the first argument of the cached call
+    if getattr(f, '__self__', None) is not None:
+        args = (f.__self__,) + args
+
+    return util.cache_key(func_name, *args, **kwargs)
 
 def cached(*args, **kwargs):
-    def decorator(f, expires=CACHE_EXPIRY, key=None):
+    def decorator(f, expires=CACHE_EXPIRY, key=None, backend=None):
+        _get = backend.get if backend is not None else get
+        _set = backend.set if backend is not None else set
+
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            _key = key or _build_key(f.__name__, *args, **kwargs)
+            _key = key or util.cache_key(f.__name__, *args, **kwargs)
             if callable(_key):
                 _key = _key(*args, **kwargs)
 
             if not kwargs.pop('_skip_cache', False):
-                value = get(_key)
+                value = _get(_key)
                 if value != None:
                     log('Cache Hit: {}'.format(_key))
                     return value
 
-            value = f(*args, **kwargs)
-            if value != None:
-                set(_key, value, expires)
+            def _compute():
+                value = f(*args, **kwargs)
+                if value != None:
+                    _set(_key, value, expires)
+
+                return value
 
-            return value
+            return _flights.do(_key, _compute)
 
+        funcs.append(f.__name__)
         return decorated_function
 
     return lambda f: decorator(f, *args, **kwargs)
 
 @signals.on(signals.AFTER_DISPATCH)
 def remove_expired():
-    _time = time()
-    delete  = []
+    now     = time()
+    expired = dict.fromkeys(cache.data.expire())
+
+    # stale heap entries are keys since deleted or set again
+    while cache.expiries and cache.expiries[0][0] < now:
+        expires, key = heapq.heappop(cache.expiries)
 
-    for key in cache.data.keys():
-        if cache.data[key][1] < _time:
-            delete.append(key)
+        row = cache.index.get(key)
+        if row and row[0] == expires:
+            expired[key] = True
 
-    for key in delete:
-        cache.data.pop(key, None)
+    # delete() also clears the window property on save
+    for key in expired:
+        delete(key)
 
-    if delete:
-        log('Mem Cache: Deleted {} Expired Rows'.format(len(delete)))
+    if expired:
+        log('Mem Cache: Deleted {} Expired Rows'.format(len(expired)))
+
+    log.debug('Mem Cache: {hits} hits / {misses} misses / {evictions} evictions'.format(**cache.data.stats))
 
     if settings.getBool('persist_cache', True):
-        _window.setProperty(cache_key, pickle.dumps(cache.data))
-        cache.data.clear()
+        save()
+
+        if not MEM_CACHE_RESIDENT:
+            cache.data.clear()
+            cache.gen = None
 
 @router.route(ROUTE_CLEAR_CACHE)
 def clear_cache(key, **kwargs):
@@ -3,11 +3,12 @@ import re
 import shutil
 
 from functools import wraps
+from itertools import chain
 
 import xbmc, xbmcplugin
 
 from . import router, gui, settings, userdata, inputstream, signals
-from .constants import ROUTE_SETTINGS, ROUTE_RESET, ROUTE_SERVICE, ROUTE_CLEAR_CACHE, ROUTE_IA_SETTINGS, ROUTE_IA_INSTALL, ROUTE_IA_QUALITY, ADDON_ICON, ADDON_FANART, ADDON_ID, ADDON_NAME, ROUTE_AUTOPLAY_TAG, ADDON_PROFILE
+from .constants import ROUTE_SETTINGS, ROUTE_RESET, ROUTE_SERVICE, ROUTE_CLEAR_CACHE, ROUTE_IA_SETTINGS, ROUTE_IA_INSTALL, ROUTE_IA_QUALITY, ADDON_ICON, ADDON_FANART, ADDON_ID, ADDON_NAME, ROUTE_AUTOPLAY_TAG, ADDON_PROFILE, GUI_BATCH_SIZE
 from .log import log
 from .language import _
 from .exceptions import PluginError
@@ -141,8 +142,9 @@ def _reset(**kwargs):
 
     xbmc.executeJSONRPC('{{"jsonrpc":"2.0","id":1,"method":"Addons.SetAddonEnabled","params":{{"addonid":"{}","enabled":false}}}}'.format(ADDON_ID))
 
-    _close()
+    # truncate reopens the db, close it again so the profile can be removed on windows
     userdata.clear()
+    _close()
     shutil.rmtree(ADDON_PROFILE)
 
     xbmc.executeJSONRPC('{{"jsonrpc":"2.0","id":1,"method":"Addons.SetAddonEnabled","params":{{"addonid":"{}","enabled":true}}}}'.format(ADDON_ID))
@@ -211,8 +213,8 @@ class Item(gui.Item):
 
 #Plugin.Folder()
 class Folder(object):
-    def __init__(self, items=None, title=None, content='videos', updateListing=False, cacheToDisc=True, sort_methods=None, thunb=None, fanart=None, no_items_label=_.NO_ITEMS):
-        self.items = items or []
+    def __init__(self, items=None, title=None, content='videos', updateListing=False, cacheToDisc=True, sort_methods=None, thunb=None, fanart=None, no_items_label=_.NO_ITEMS, batch_size=GUI_BATCH_SIZE):
+        self.items = items if items is not None else []
         self.title = title
         self.content = content
         self.updateListing = updateListing
@@ -221,23 +223,34 @@ class Folder(object):
         self.thunb = thunb or ADDON_ICON
         self.fanart = fanart or ADDON_FANART
         self.no_items_label = no_items_label
+        self.batch_size = batch_size
 
     def display(self):
         handle = _handle()
-        items  = [i for i in self.items if i]
+        total  = len(self.items) if isinstance(self.items, list) else 0
+        count  = 0
+        batch  = []
+
+        # items can be a generator so they are added as they are built
+        for item in self.items:
+            if not item:
+                continue
+
+            batch.append(self._get_entry(item))
+            count += 1
 
-        if not items and self.no_items_label:
-            items.append(Item(
+            if self.batch_size and len(batch) >= self.batch_size:
+                xbmcplugin.addDirectoryItems(handle, batch, total)
+                batch = []
+
+        if not count and self.no_items_label:
+            batch.append(self._get_entry(Item(
                 label = _(self.no_items_label, _label=True), 
                 is_folder = False,
-            ))
-
-        for item in items:
-            item.art['thumb'] = item.art.get('thumb') or self.thunb
-            item.art['fanart'] = item.art.get('fanart') or self.fanart
+            )))
 
-            li = item.get_li()
-            xbmcplugin.addDirectoryItem(handle, item.path, li, item.is_folder)
+        if batch:
+            xbmcplugin.addDirectoryItems(handle, batch, total)
 
         if self.content: xbmcplugin.setContent(handle, self.content)
         if self.title: xbmcplugin.setPluginCategory(handle, self.title)
@@ -247,17 +260,27 @@ class Folder(object):
 
         xbmcplugin.endOfDirectory(handle, succeeded=True, updateListing=self.updateListing, cacheToDisc=self.cacheToDisc)
 
+    def _get_entry(self, item):
+        item.art['thumb'] = item.art.get('thumb') or self.thunb
+        item.art['fanart'] = item.art.get('fanart') or self.fanart
+
+        return (item.path, item.get_li(), item.is_folder)
+
     def add_item(self, *args, **kwargs):
         position = kwargs.pop('_position', None)
         
         item = Item(*args, **kwargs)
         
         if position == None:
-            self.items.append(item)
+            self.add_items([item])
         else:
+            self.items = list(self.items)
             self.items.insert(int(position), item)
 
         return item
 
     def add_items(self, items):
-        self.items.extend(items)
\ No newline at end of file
+        if isinstance(self.items, list) and isinstance(items, list):
+            self.items.extend(items)
+        else:
+            self.items = chain(self.items, items)
\ No newline at end of file
@@ -1,19 +1,23 @@
 from urlparse import parse_qsl
-from urllib import urlencode, unquote
+from urllib import quote_plus, unquote
 
 from . import signals
-from .constants import ROUTE_TAG, ADDON_ID, ROUTE_LIVE_TAG, ROUTE_LIVE_SUFFIX, ROUTE_URL_TAG
+from .constants import ROUTE_TAG, ADDON_ID, ROUTE_LIVE_TAG, ROUTE_LIVE_SUFFIX, ROUTE_URL_TAG, ROUTE_FRAGMENT_CACHE
 from .log import log
 from .language import _
 from .exceptions import RouterError, Exit
 
-_routes = {}
+_routes    = {}
+_urls      = {}
+_bases     = {}
+_fragments = {}
 
 # @router.add('_settings', settings)
 def add(url, f):
     if url == None:
         url = f.__name__
     _routes[url] = f
+    _urls[f.__name__] = url
 
 # @router.route('_settings')
 def route(url):
@@ -46,11 +50,11 @@ def parse_url(url):
     return function, params
 
 def url_for_func(func, **kwargs):
-    for url in _routes:
-        if _routes[url].__name__ == func.__name__:
-            return build_url(url, **kwargs)
+    url = _urls.get(func.__name__)
+    if url == None:
+        raise RouterError(_(_.ROUTER_NO_URL, function_name=func.__name__))
 
-    raise RouterError(_(_.ROUTER_NO_URL, function_name=func.__name__))
+    return build_url(url, **kwargs)
 
 def url_for(func_or_url, **kwargs):
     if callable(func_or_url):
@@ -58,22 +62,53 @@ def url_for(func_or_url, **kwargs):
     else:
         return build_url(func_or_url, **kwargs)
 
+def _fragment(key, value):
+    # type is part of the key as 1 == True == 1.0
+    cache_key = (key, type(value), value)
+
+    try:
+        return _fragments[cache_key]
+    except KeyError:
+        pass
+    except TypeError:
+        cache_key = None
+
+    try: value = unicode(value).encode('utf-8')
+    except: value = str(value)
+
+    fragment = quote_plus(str(key)) + '=' + quote_plus(value)
+
+    if cache_key and len(_fragments) < ROUTE_FRAGMENT_CACHE:
+        _fragments[cache_key] = fragment
+
+    return fragment
+
+def _base(addon_id, url):
+    try:
+        return _bases[(addon_id, url)]
+    except KeyError:
+        base = _bases[(addon_id, url)] = 'plugin://{0}/?{1}'.format(addon_id, _fragment(ROUTE_TAG, url))
+        return base
+
 def build_url(url, addon_id=ADDON_ID, **kwargs):
-    kwargs[ROUTE_TAG] = url
     is_live = kwargs.pop('_is_live', False)
 
-    params = []
-    for k in sorted(kwargs):
-        if kwargs[k] == None:
-            continue
+    # fast path for the common shapes: 'url' and 'url?id=x'
+    if not is_live and len(kwargs) <= 1:
+        key, value = kwargs.items()[0] if kwargs else (None, None)
 
-        try: params.append((k, unicode(kwargs[k]).encode('utf-8')))
-        except: params.append((k, kwargs[k]))
+        if value == None:
+            return _base(addon_id, url)
+        elif key > ROUTE_TAG:
+            return _base(addon_id, url) + '&' + _fragment(key, value)
+
+    kwargs[ROUTE_TAG] = url
 
+    params = [_fragment(k, kwargs[k]) for k in sorted(kwargs) if kwargs[k] != None]
     if is_live:
-        params.append((ROUTE_LIVE_TAG, ROUTE_LIVE_SUFFIX))
+        params.append(_fragment(ROUTE_LIVE_TAG, ROUTE_LIVE_SUFFIX))
 
-    return 'plugin://{0}/?{1}'.format(addon_id, urlencode(params))
+    return 'plugin://{0}/?{1}'.format(addon_id, '&'.join(params))
 
 def redirect(url):
     log.debug('Redirect -> {}'.format(url))
@@ -1,11 +1,91 @@
+import sys
+import random
+from time import time, sleep
+from email.utils import parsedate_tz, mktime_tz
+
 import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import default_headers
 
 from . import userdata, settings
 from .log import log
-from .constants import SESSION_TIMEOUT, SESSION_ATTEMPTS, SESSION_CHUNKSIZE
+from .constants import SESSION_TIMEOUT, SESSION_ATTEMPTS, SESSION_CHUNKSIZE, SESSION_POOL_HOSTS, SESSION_POOL_SIZE, SESSION_IDLE_TIMEOUT
+from .constants import SESSION_BACKOFF, SESSION_MAX_BACKOFF, SESSION_RETRY_STATUSES, SESSION_IDEMPOTENT_METHODS, SESSION_RETRY_BUDGET, SESSION_RETRY_MIN
+
+_sessions = {}
+
+class RetryPolicy(object):
+    def __init__(self, backoff=SESSION_BACKOFF, max_backoff=SESSION_MAX_BACKOFF, statuses=SESSION_RETRY_STATUSES, methods=SESSION_IDEMPOTENT_METHODS, budget=SESSION_RETRY_BUDGET):
+        self.backoff     = backoff
+        self.max_backoff = max_backoff
+        self.statuses    = statuses
+        self.methods     = methods
+        self.budget      = budget
+        self._requests   = 0
+        self._retries    = 0
+
+    def started(self):
+        self._requests += 1
+
+    def should_retry(self, method, resp=None, error=None):
+        if self._retries >= SESSION_RETRY_MIN + self.budget * self._requests:
+            log.debug('HTTP retry budget exhausted')
+            return False
+
+        idempotent = method.upper() in self.methods
+
+        if error is not None:
+            # a connect timeout never reached the server so is always safe to retry
+            retry = idempotent or isinstance(error, requests.exceptions.ConnectTimeout)
+        else:
+            # 429/503 mean the request was rejected before being processed
+            retry = resp.status_code in self.statuses and (idempotent or resp.status_code in (429, 503))
+
+        if retry:
+            self._retries += 1
+
+        return retry
+
+    def delay(self, attempt, resp=None):
+        retry_after = resp.headers.get('Retry-After') if resp is not None else None
+
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                date  = parsedate_tz(retry_after)
+                delay = mktime_tz(date) - time() if date else 0
+
+            return min(max(delay, 0), self.max_backoff)
+
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        return random.uniform(delay / 2, delay)
+
+# session.get('skygo', HEADERS)
+def get(key, *args, **kwargs):
+    session = _sessions.get(key)
+
+    if session and time() - session.last_used > SESSION_IDLE_TIMEOUT:
+        log.debug('Session {} idle. Closing'.format(key))
+        session.close()
+        session = None
+
+    # eg. new headers or pool sizes after a settings change
+    elif session and session.options != (args, kwargs):
+        log.debug('Session {} options changed. Rebuilding'.format(key))
+        session.close()
+        session = None
+
+    if session:
+        session.reset()
+    else:
+        session = _sessions[key] = Session(*args, **kwargs)
+        session.options = (args, kwargs)
+
+    return session
 
 class Session(requests.Session):
-    def __init__(self, headers=None, cookies_key=None, base_url='{}', timeout=None, attempts=None):
+    def __init__(self, headers=None, cookies_key=None, base_url='{}', timeout=None, attempts=None, pool_size=SESSION_POOL_SIZE, pool_sizes=None, retry=None):
         super(Session, self).__init__()
 
         self._headers     = headers or {}
@@ -13,9 +93,27 @@ class Session(requests.Session):
         self._base_url    = base_url
         self._timeout     = timeout or SESSION_TIMEOUT
         self._attempts    = attempts or SESSION_ATTEMPTS
-        self._verify      = settings.getBool('verify_ssl', True)
+        self._retry       = retry or RetryPolicy()
+        self.last_used    = time()
+        self.options      = None
+
+        adapter = HTTPAdapter(pool_connections=SESSION_POOL_HOSTS, pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+        for host, size in (pool_sizes or {}).items():
+            self.mount('https://{}/'.format(host), HTTPAdapter(pool_connections=1, pool_maxsize=size))
 
+        self.reset()
+
+    def reset(self):
+        self._verify = settings.getBool('verify_ssl', True)
+
+        self.headers.clear()
+        self.headers.update(default_headers())
         self.headers.update(self._headers)
+
+        self.cookies.clear()
         if self._cookies_key:
             self.cookies.update(userdata.get(self._cookies_key, {}))
 
@@ -23,18 +121,41 @@ class Session(requests.Session):
         if not url.startswith('http'):
             url = self._base_url.format(url)
 
+        self.last_used = time()
+
         kwargs['timeout'] = timeout or self._timeout
         kwargs['verify'] = verify or self._verify
         attempts = attempts or self._attempts
 
+        self._retry.started()
+
         for i in range(1, attempts+1):
-            log('Attempt {}/{}: {} {} {}'.format(i, attempts, method, url, kwargs if method.lower() != 'post' else ""))
+            resp  = None
+            error = None
+            start = time()
 
             try:
-                return super(Session, self).request(method, url, **kwargs)
-            except:
-                if i == attempts:
-                    raise
+                resp = super(Session, self).request(method, url, **kwargs)
+            except Exception:
+                error = sys.exc_info()
+
+            log.debug('HTTP attempt={}/{} method={} url={} status={} error={} elapsed={:.3f} {}'.format(
+                i, attempts, method.upper(), url, resp.status_code if resp is not None else None,
+                type(error[1]).__name__ if error else None, time() - start, kwargs if method.lower() != 'post' else ''))
+
+            if i == attempts or not self._retry.should_retry(method, resp, error and error[1]):
+                if error:
+                    raise error[0], error[1], error[2]
+
+                return resp
+
+            delay = self._retry.delay(i, resp)
+            log.debug('HTTP retry in {:.2f}s'.format(delay))
+
+            if resp is not None:
+                resp.close()
+
+            sleep(delay)
 
     def save_cookies(self):
         if not self._cookies_key:
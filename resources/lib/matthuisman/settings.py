@@ -1,9 +1,18 @@
 import json
 
+from . import signals
 from .constants import ADDON
 
+# raw setting values read from Kodi during this dispatch
+_snapshot = {}
+
 def open():
     ADDON.openSettings()
+    reset()
+
+@signals.on(signals.BEFORE_DISPATCH)
+def reset():
+    _snapshot.clear()
 
 def getDict(key, default=None):
     try:
@@ -47,10 +56,17 @@ def setBool(key, value=True):
     set(key, 'true' if value else 'false')
 
 def get(key, default=''):
-    return ADDON.getSetting(key) or default
+    try:
+        value = _snapshot[key]
+    except KeyError:
+        value = _snapshot[key] = ADDON.getSetting(key)
+
+    return value or default
 
 def set(key, value=''):
-    ADDON.setSetting(key, str(value))
+    value = str(value)
+    ADDON.setSetting(key, value)
+    _snapshot[key] = value
 
 FRESH = getBool('_fresh', True)
 if FRESH:
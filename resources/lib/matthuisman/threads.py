@@ -0,0 +1,159 @@
+import sys
+import threading
+from time import time
+from Queue import Queue, Empty
+
+from .log import log
+from .constants import THREAD_WORKERS, THREAD_IDLE_TIMEOUT
+
+class Task(object):
+    def __init__(self, func, args, kwargs):
+        self.func    = func
+        self.args    = args
+        self.kwargs  = kwargs
+        self.elapsed = None
+        self._value  = None
+        self._error  = None
+        self._done   = threading.Event()
+
+    def run(self):
+        start = time()
+
+        try:
+            self._value = self.func(*self.args, **self.kwargs)
+        except:
+            self._error = sys.exc_info()
+        finally:
+            self.elapsed = time() - start
+            self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        self._done.wait(timeout)
+
+        if self._error:
+            raise self._error[0], self._error[1], self._error[2]
+
+        return self._value
+
+class Pool(object):
+    def __init__(self, workers=THREAD_WORKERS, name='Pool', daemon=True):
+        self.name     = name
+        self.daemon   = daemon
+        self._workers = max(1, int(workers))
+        self._queue   = Queue()
+        self._lock    = threading.Lock()
+        self._running = 0
+        self._threads = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, func, *args, **kwargs):
+        task = Task(func, args, kwargs)
+
+        with self._lock:
+            self._queue.put(task)
+
+            if self._running < self._workers:
+                self._running += 1
+                thread = threading.Thread(target=self._worker)
+                thread.daemon = self.daemon
+                thread.start()
+                self._threads.append(thread)
+
+        return task
+
+    def imap(self, func, items, progress=None):
+        tasks = [self.submit(func, item) for item in items]
+
+        for count, task in enumerate(tasks, start=1):
+            result = task.result()
+            log.debug('{}: Task {}/{} took {:.3f}s'.format(self.name, count, len(tasks), task.elapsed))
+
+            if progress:
+                progress(count, len(tasks))
+
+            yield result
+
+    def join(self, timeout=None):
+        if timeout is None:
+            self._queue.join()
+            return True
+
+        end = time() + timeout
+
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = end - time()
+                if remaining <= 0:
+                    return False
+
+                self._queue.all_tasks_done.wait(remaining)
+
+        return True
+
+    def close(self, wait=True):
+        with self._lock:
+            threads, self._threads = self._threads, []
+            for thread in threads:
+                self._queue.put(None)
+
+        if not wait:
+            return
+
+        for thread in threads:
+            thread.join()
+
+    def _worker(self):
+        while True:
+            try:
+                task = self._queue.get(timeout=THREAD_IDLE_TIMEOUT)
+            except Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._running -= 1
+                        self._threads.remove(threading.current_thread())
+                        return
+
+                continue
+
+            try:
+                if task is None:
+                    with self._lock:
+                        self._running -= 1
+                    return
+
+                task.run()
+            finally:
+                self._queue.task_done()
+
+
+class SingleFlight(object):
+    def __init__(self):
+        self._lock  = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            task   = self._calls.get(key)
+            leader = task is None
+
+            if leader:
+                task = self._calls[key] = Task(func, args, kwargs)
+
+        if leader:
+            try:
+                task.run()
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+        else:
+            log.debug('Single Flight: Waiting on {}'.format(key))
+
+        return task.result()
@@ -1,23 +1,66 @@
-from . import settings
-from .constants import USERDATA_KEY
+from contextlib import contextmanager
 
-_userdata = settings.getDict(USERDATA_KEY, {})
+from . import peewee, database, settings, signals
+from .constants import USERDATA_KEY, USERDATA_TABLENAME
+from .log import log
+
+_userdata = {}
+_loaded   = []
+
+class Userdata(database.Model):
+    key   = peewee.TextField(unique=True)
+    value = database.JSONField()
+
+    class Meta:
+        table_name = USERDATA_TABLENAME
+
+def _load():
+    if _loaded:
+        return
+
+    legacy = settings.getDict(USERDATA_KEY, {})
+    if legacy:
+        log('Userdata: Migrating {} keys from settings'.format(len(legacy)))
+        Userdata.replace_many([{'key': key, 'value': value} for key, value in legacy.items()])
+        settings.remove(USERDATA_KEY)
+
+    _userdata.clear()
+    _userdata.update({row.key: row.value for row in Userdata.select()})
+    _loaded.append(True)
+
+# other processes (eg. the service) may have written since the last dispatch
+@signals.on(signals.BEFORE_DISPATCH)
+def reset():
+    del _loaded[:]
+
+# with userdata.batch(): commits several writes in one transaction
+@contextmanager
+def batch():
+    try:
+        with database.db.atomic():
+            yield
+    except:
+        # rolled back so reload what was committed
+        del _loaded[:]
+        raise
 
 def get(key, default=None):
+    _load()
     return _userdata.get(key, default)
 
 def set(key, value):
+    _load()
+    Userdata.set(key=key, value=value)
     _userdata[key] = value
-    save()
-
-def save():
-    settings.setDict(USERDATA_KEY, _userdata)
 
 def delete(key):
+    _load()
     if key in _userdata:
+        Userdata.delete_where(Userdata.key == key)
         del _userdata[key]
-        save()
-    
+
 def clear():
+    Userdata.truncate()
     _userdata.clear()
-    save()
\ No newline at end of file
+
+database.tables.append(Userdata)
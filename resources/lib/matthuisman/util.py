@@ -27,6 +27,55 @@ def hash_6(value, default=None):
     h = hashlib.md5(str(value))
     return h.digest().encode('base64')[:6]
 
+def hash_key(value):
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+
+    return hashlib.md5(str(value)).hexdigest()
+
+def _encode_str(value):
+    return 's{}:{}'.format(len(value), value)
+
+def _encode_unicode(value):
+    return _encode_str(value.encode('utf-8'))
+
+_key_encoders = {
+    str:        _encode_str,
+    unicode:    _encode_unicode,
+    int:        lambda value: 'i{};'.format(value),
+    long:       lambda value: 'i{};'.format(value),
+    float:      lambda value: 'f{!r};'.format(value),
+    bool:       lambda value: 'b1' if value else 'b0',
+    type(None): lambda value: 'n',
+}
+
+def _encode_key(value):
+    # scalars are a single dict lookup, containers recurse
+    encoder = _key_encoders.get(type(value))
+    if encoder:
+        return encoder(value)
+
+    if isinstance(value, (list, tuple)):
+        return 'l{}:'.format(len(value)) + ''.join(_encode_key(item) for item in value)
+
+    if isinstance(value, dict):
+        items = sorted(_encode_key(k) + _encode_key(v) for k, v in value.items())
+        return 'd{}:'.format(len(items)) + ''.join(items)
+
+    # non-primitives (eg. self) only count by type, so they still hold their place
+    return 'o' + _encode_str(type(value).__name__)
+
+def cache_key(func_name, *args, **kwargs):
+    # every encoded value is self-delimiting so parts can simply be joined
+    key = [_encode_str(func_name), 'a']
+    key.extend(_encode_key(arg) for arg in args)
+
+    key.append('k')
+    for k in sorted(kwargs):
+        key.append(_encode_str(k) + _encode_key(kwargs[k]))
+
+    return hash_key(''.join(key))
+
 def md5sum(filepath):
     if not os.path.exists(filepath):
         return None
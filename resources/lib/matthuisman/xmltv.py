@@ -0,0 +1,76 @@
+import time
+from xml.sax.saxutils import escape
+
+import arrow
+
+from .constants import XMLTV_CHUNKSIZE, XMLTV_TIME_FORMAT
+
+_HEADER    = u'<?xml version="1.0" encoding="utf-8" ?><tv>'
+_FOOTER    = u'</tv>'
+_CHANNEL   = u'<channel id="{0}"><display-name>{1}</display-name><icon src="{2}"/></channel>'.format
+_PROGRAMME = u'<programme channel="{0}" start="{1}" stop="{2}"><title>{3}</title><desc>{4}</desc><category>{5}</category></programme>'.format
+
+def to_timestamp(value):
+    try:
+        epoch = float(value)
+    except (TypeError, ValueError):
+        return arrow.get(value).timestamp
+
+    # millisecond epochs
+    if epoch > 10**11:
+        epoch /= 1000
+
+    return int(epoch)
+
+class Writer(object):
+    def __init__(self, f, chunksize=XMLTV_CHUNKSIZE):
+        self._f          = f
+        self._chunksize  = chunksize
+        self._buffer     = []
+        self._size       = 0
+        self._timestamps = {}
+        self.programmes  = 0
+
+    def __enter__(self):
+        self._write(_HEADER)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self._write(_FOOTER)
+
+        self.flush()
+
+    def channel(self, id, name, icon=None):
+        self._write(_CHANNEL(id, escape(name or u''), escape(icon or u'')))
+
+    def programme(self, channel, start, stop, title, desc=None, category=None):
+        self._write(_PROGRAMME(channel, self.format_time(start), self.format_time(stop),
+            escape(title or u''), escape(desc or u''), escape(category or u'')))
+
+        self.programmes += 1
+
+    def format_time(self, value):
+        try:
+            return self._timestamps[value]
+        except KeyError:
+            pass
+
+        formatted = time.strftime(XMLTV_TIME_FORMAT, time.gmtime(to_timestamp(value)))
+        self._timestamps[value] = formatted
+        return formatted
+
+    def _write(self, text):
+        self._buffer.append(text)
+        self._size += len(text)
+
+        if self._size >= self._chunksize:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+
+        self._f.write(u''.join(self._buffer).encode('utf8'))
+        self._buffer = []
+        self._size   = 0
@@ -0,0 +1,158 @@
+import json
+import hashlib
+
+from matthuisman import database, peewee
+from matthuisman.log import log
+from matthuisman.util import hash_6
+
+from .constants import SEARCH_LIMIT
+
+class Event(database.Model):
+    channel  = peewee.TextField()
+    start    = peewee.IntegerField()
+    stop     = peewee.IntegerField()
+    title    = peewee.TextField()
+    desc     = peewee.TextField(null=True)
+    category = peewee.TextField(null=True)
+
+    class Meta:
+        table_name = 'epg_events'
+        indexes = (
+            (('channel', 'start'), True),
+            (('start',), False),
+        )
+
+class EPGWindow(database.Model):
+    channel = peewee.TextField()
+    day     = peewee.IntegerField()
+    fetched = peewee.IntegerField()
+
+    class Meta:
+        table_name = 'epg_windows'
+        indexes = (
+            (('channel', 'day'), True),
+        )
+
+class Title(database.Model):
+    catalogue  = peewee.TextField()
+    content_id = peewee.TextField()
+    letter     = peewee.TextField()
+    title      = peewee.TextField()
+    data       = database.JSONField()
+
+    class Meta:
+        table_name = 'titles'
+        indexes = (
+            (('catalogue', 'content_id'), True),
+            (('catalogue', 'letter', 'title'), False),
+        )
+
+class TitleIndex(database.Model):
+    key       = peewee.TextField(unique=True)
+    built     = peewee.IntegerField()
+    refreshed = peewee.IntegerField()
+
+    class Meta:
+        table_name = 'title_index'
+
+database.tables.extend([Event, EPGWindow, Title, TitleIndex])
+
+
+class SearchIndex(database.Model):
+    # fts5 virtual table, only queried with raw sql
+    SCHEMA = "CREATE VIRTUAL TABLE {} USING fts5(catalogue UNINDEXED, content_id UNINDEXED, title, synopsis, episodes, channel, data UNINDEXED, prefix='2 3')"
+
+    _available = None
+
+    class Meta:
+        table_name = 'search_index'
+
+    @classmethod
+    def get_checksum(cls):
+        return hash_6(cls.SCHEMA)
+
+    @classmethod
+    def create_table(cls, safe=True, **options):
+        try:
+            database.db.execute_sql(cls.SCHEMA.format(cls._meta.table_name))
+        except peewee.OperationalError as e:
+            log.warning('Search Index: FTS5 unavailable ({})'.format(e))
+            cls._available = False
+        else:
+            cls._available = True
+
+    @classmethod
+    def drop_table(cls, safe=True, **options):
+        database.db.execute_sql('DROP TABLE IF EXISTS {}'.format(cls._meta.table_name))
+
+    @classmethod
+    def available(cls):
+        if cls._available is None:
+            cls._available = cls.table_exists()
+
+        return cls._available
+
+    @classmethod
+    def _rowid(cls, catalogue, content_id):
+        return int(hashlib.md5(u'{}|{}'.format(catalogue, content_id).encode('utf8')).hexdigest()[:15], 16)
+
+    @classmethod
+    def add(cls, catalogue, rows):
+        if not cls.available():
+            return
+
+        docs = []
+        for row in rows:
+            channel = row.get('channel')
+            if not isinstance(channel, basestring):
+                channel = ''
+
+            docs.append((cls._rowid(catalogue, row['id']), catalogue, row['id'], row['title'], row.get('synopsis', ''), '', channel, json.dumps(row)))
+
+        with database.db.atomic():
+            database.db.cursor().executemany('INSERT OR REPLACE INTO {} (rowid, catalogue, content_id, title, synopsis, episodes, channel, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)'.format(cls._meta.table_name), docs)
+
+    @classmethod
+    def delete_catalogue(cls, catalogue):
+        if not cls.available():
+            return
+
+        database.db.execute_sql('DELETE FROM {} WHERE catalogue = ?'.format(cls._meta.table_name), (catalogue,))
+
+    @classmethod
+    def add_episodes(cls, content_id, episodes):
+        if not cls.available():
+            return
+
+        database.db.execute_sql('UPDATE {} SET episodes = ? WHERE content_id = ?'.format(cls._meta.table_name), (u' '.join(episodes), content_id))
+
+    @classmethod
+    def search(cls, text, limit=SEARCH_LIMIT):
+        if not cls.available():
+            return None
+
+        # gui.input and url params give utf-8 bytes
+        if isinstance(text, str):
+            text = text.decode('utf-8')
+
+        words = [u'"{}"*'.format(word.replace(u'"', u'""')) for word in text.split()]
+        if not words:
+            return []
+
+        cursor = database.db.execute_sql('SELECT content_id, data FROM {0} WHERE {0} MATCH ? ORDER BY bm25({0}, 0, 0, 10.0, 2.0, 1.0, 1.0, 0)'.format(cls._meta.table_name), (u' '.join(words),))
+
+        # a title can be in more than one catalogue, keep its best match
+        rows = []
+        seen = set()
+        for content_id, data in cursor:
+            if content_id in seen:
+                continue
+
+            seen.add(content_id)
+            rows.append(json.loads(data))
+            if len(rows) >= limit:
+                break
+
+        return rows
+
+database.tables.append(SearchIndex)
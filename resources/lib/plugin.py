@@ -1,19 +1,22 @@
+from time import time
 from string import ascii_uppercase
-
-from xml.sax.saxutils import escape
+from itertools import islice
 
 import arrow
-import xbmcplugin
+import xbmc, xbmcplugin
 
-from matthuisman import plugin, gui, userdata, signals, inputstream, settings
+from matthuisman import plugin, gui, userdata, signals, inputstream, settings, xmltv, database, mem_cache, peewee, cache, threads
+from matthuisman.log import log
 from matthuisman.exceptions import Error
 from matthuisman.constants import ADDON_ID
 
 from .api import API
-from .constants import IMAGE_URL, HEADERS
+from .constants import IMAGE_URL, HEADERS, EPG_EXPIRY, EPG_EXPIRY_TODAY, CHANNELS_EXPIRY, SUBSCRIPTIONS_EXPIRY, PREWARM_KEY, PREWARM_RATIO, PREWARM_MIN, PREWARM_RETRY, PREWARM_MAX_RETRY, PREWARM_EPG_HOURS, TITLE_INDEX_EXPIRY, TITLE_INDEX_REFRESH, SEARCH_SECTIONS, SERIES_PREFETCH_MAX, SERIES_PREFETCH_THREADS, EPG_LEASE_KEY
+from .models import Event, EPGWindow, Title, TitleIndex, SearchIndex
 from .language import _
 
 api = API()
+_prefetch = {'dispatch': 0, 'pool': None}
 
 @signals.on(signals.BEFORE_DISPATCH)
 def before_dispatch():
@@ -78,7 +81,7 @@ def _get_channels():
 
         return None
 
-    for row in sorted(rows, key=lambda r: float(r.get('sky$liveChannelOrder', 'inf'))):
+    for row in rows:
         if 'Live' not in row.get('sky$channelType', []):
             continue
 
@@ -128,7 +131,7 @@ def channels(**kwargs):
 
     subscriptions = userdata.get('subscriptions', [])
 
-    for row in sorted(api.channels(), key=lambda row: row['title']):
+    for row in api.channels(order='title'):
         label = row['title']
 
         subscribed = _is_subscribed(subscriptions, row.get('media$categories'))
@@ -159,15 +162,41 @@ def content(label, section='', sortby=None, title=None, channels='', start=0, **
             folder.add_item(label=item[0], path=plugin.url_for(content, label=item[0], section=section, sortby=item[1], channels=channels))
 
     elif sortby == 'TITLE' and title == None:
+        # channel listings are paged from the api, only whole sections are indexed locally
+        counts = None
+        if not channels:
+            _titles_used()
+            key    = _title_index(section, '')
+            counts = dict(Title.select(Title.letter, peewee.fn.COUNT(Title.id)).where(Title.catalogue == key).group_by(Title.letter).tuples())
+
         items = [[c, c] for c in ascii_uppercase]
         items.insert(0, [_.ALL, ''])
         items.append([_.ZERO_9, '0-9'])
-        
+
         for item in items:
-            folder.add_item(label=item[0], path=plugin.url_for(content, label=item[0], section=section, sortby=sortby, title=item[1], channels=channels))
+            if counts is None:
+                folder.add_item(label=item[0], path=plugin.url_for(content, label=item[0], section=section, sortby=sortby, title=item[1], channels=channels))
+                continue
+
+            count = sum(counts.values()) if item[1] == '' else counts.get(item[1], 0)
+            if not count:
+                continue
+
+            folder.add_item(label=_(_.LETTER_COUNT, label=item[0], count=count), path=plugin.url_for(content, label=item[0], section=section, sortby=sortby, title=item[1], channels=channels))
+
+    elif sortby == 'TITLE' and not channels:
+        query = Title.select(Title.data).where(Title.catalogue == _title_index(section, '')).order_by(Title.title)
+        if title:
+            query = query.where(Title.letter == title)
+
+        folder.add_items(_process_content([row.data for row in query]))
 
     else:
-        data   = api.content(section, sortby=sortby, title=title, channels=channels, start=start)
+        if settings.getBool('load_all', False):
+            data = api.content_all(section=section, sortby=sortby, title=title, channels=channels)
+        else:
+            data = api.content(section, sortby=sortby, title=title, channels=channels, start=start)
+
         items = _process_content(data['data'])
         folder.add_items(items)
 
@@ -179,6 +208,54 @@ def content(label, section='', sortby=None, title=None, channels='', start=0, **
 
     return folder
 
+def _title_letter(title):
+    letter = title[:1].upper()
+    return letter if letter in ascii_uppercase else '0-9'
+
+def _index_titles(key, rows):
+    SearchIndex.add(key, rows)
+
+    Title.replace_many([{
+        'catalogue':  key,
+        'content_id': row['id'],
+        'letter':     _title_letter(row['title']),
+        'title':      row['title'].upper(),
+        'data':       row,
+    } for row in rows])
+
+def _title_index(section, channels):
+    key   = u'{}|{}'.format(section, channels)
+    now   = int(time())
+    state = TitleIndex.get_or_none(TitleIndex.key == key)
+
+    if not state or state.built < now - TITLE_INDEX_EXPIRY:
+        data = api.content_all(section=section, sortby='TITLE', title='', channels=channels)
+
+        with database.db.atomic():
+            Title.delete_where(Title.catalogue == key)
+            SearchIndex.delete_catalogue(key)
+            _index_titles(key, data['data'])
+            TitleIndex.set(key=key, built=now, refreshed=now)
+
+    elif state.refreshed < now - TITLE_INDEX_REFRESH:
+        # straight from the api, the cached pages could be hours old
+        data = api._content(section, sortby='LATEST', channels=channels)
+
+        with database.db.atomic():
+            _index_titles(key, data['data'])
+            TitleIndex.update(refreshed=now).where(TitleIndex.key == key).execute()
+
+    return key
+
+# the service only keeps the title index built once search or A-Z is used
+def _titles_used():
+    if not userdata.get('titles_used'):
+        userdata.set('titles_used', True)
+
+def _search_index_fresh():
+    keys = [u'{}|'.format(section) for section in SEARCH_SECTIONS]
+    return TitleIndex.select().where(TitleIndex.key.in_(keys), TitleIndex.built > int(time()) - TITLE_INDEX_EXPIRY).count() == len(keys)
+
 @plugin.route()
 def search(query=None, start=0, **kwargs):
     start = int(start)
@@ -191,8 +268,19 @@ def search(query=None, start=0, **kwargs):
         userdata.set('search', query)
 
     folder = plugin.Folder(title=_(_.SEARCH_FOR, query=query))
+    _titles_used()
+
+    if not start and _search_index_fresh():
+        rows = SearchIndex.search(query)
+        if rows is not None:
+            folder.add_items(_process_content(rows))
+            return folder
+
+    if settings.getBool('load_all', False):
+        data = api.content_all(text=query)
+    else:
+        data = api.content(text=query, start=start)
 
-    data = api.content(text=query, start=start)
     items = _process_content(data['data'])
     folder.add_items(items)
 
@@ -204,8 +292,49 @@ def search(query=None, start=0, **kwargs):
 
     return folder
 
+def _prefetch_series(ids):
+    dispatch = _prefetch['dispatch']
+
+    def _fetch(id):
+        # the user has moved on (reused invoker), drop what is still queued
+        if dispatch != _prefetch['dispatch']:
+            return
+
+        try:
+            api.series(id)
+        except Exception as e:
+            log.debug('Series prefetch {} failed: {}'.format(id, e))
+        finally:
+            database.close()
+
+    # listings can hold whole sections, stop looking once there's enough to fetch
+    ids = list(islice((id for id in ids if not cache.get(cache.key_for(api.series, id))), SERIES_PREFETCH_MAX))
+    if not ids:
+        return
+
+    # not daemon threads, so queued prefetches finish after the listing is shown
+    if not _prefetch['pool']:
+        _prefetch['pool'] = threads.Pool(SERIES_PREFETCH_THREADS, name='Series', daemon=False)
+
+    for id in ids:
+        _prefetch['pool'].submit(_fetch, id)
+
+    log('Series: Prefetching {}'.format(len(ids)))
+
+@signals.on(signals.BEFORE_DISPATCH)
+def _cancel_prefetch():
+    _prefetch['dispatch'] += 1
+
+# let the workers drain and exit on their own rather than waiting on them
+@signals.on(signals.AFTER_DISPATCH)
+def _release_prefetch():
+    if _prefetch['pool']:
+        _prefetch['pool'].close(wait=False)
+        _prefetch['pool'] = None
+
 def _process_content(rows):
     items = []
+    seasons = []
     subscriptions = userdata.get('subscriptions', [])
 
     for row in rows:
@@ -234,17 +363,22 @@ def _process_content(rows):
             ))
 
         elif row['type'] == 'season':
+            seasons.append(row['id'])
             items.append(plugin.Item(
                 label = label,
                 art   = {'thumb': IMAGE_URL.format(row['images'].get('MP',''))},
                 path  = plugin.url_for(series, id=row['id']),
             ))
 
+    if seasons and cache.enabled():
+        _prefetch_series(seasons)
+
     return items
 
 @plugin.route()
 def series(id, **kwargs):
     data   = api.series(id)
+    SearchIndex.add_episodes(id, [row['episodeTitle'] for row in data.get('subContent', []) if row.get('episodeTitle')])
 
     folder = plugin.Folder(title=data['title'], fanart=IMAGE_URL.format(data['images'].get('PS','')), sort_methods=[xbmcplugin.SORT_METHOD_EPISODE, xbmcplugin.SORT_METHOD_UNSORTED, xbmcplugin.SORT_METHOD_LABEL, xbmcplugin.SORT_METHOD_DATEADDED])
 
@@ -308,6 +442,10 @@ def play(id, **kwargs):
 @plugin.route()
 @plugin.login_required()
 def play_channel(id, **kwargs):
+    # asked for the same channel again while nothing is playing: the last url served didn't start
+    if not xbmc.Player().isPlaying():
+        api.invalidate_channel(id)
+
     url = api.play_channel(id)
 
     return plugin.Item(
@@ -326,30 +464,159 @@ def playlist(output, **kwargs):
             f.write('#EXTINF:-1 tvg-id="{id}" tvg-chno="{channel}" tvg-name="{name}" tvg-logo="{logo}",{name}\n{path}\n'.format(
                         id=row['channel'], channel=row['channel'], name=row['label'].encode('utf8'), logo=row['image'], path=row['path']))
 
+def _refresh_epg(ids, start, days, margin=0):
+    # the service prewarm and the epg route can both get here, give the other a chance to finish first.
+    # staleness is only worked out once we're in, so windows it fetched are skipped
+    with cache.lease(EPG_LEASE_KEY) as acquired:
+        if not acquired:
+            cache.wait(EPG_LEASE_KEY)
+
+        _update_epg(ids, start, days, margin)
+
+def _update_epg(ids, start, days, margin):
+    now   = int(time())
+    today = start.floor('day')
+
+    fetched = {}
+    for row in EPGWindow.select().where(EPGWindow.channel.in_(ids), EPGWindow.day >= today.timestamp):
+        fetched[(row.channel, row.day)] = row.fetched
+
+    windows = []
+    for i in range(days + 1):
+        day    = today.shift(days=i)
+        expiry = (EPG_EXPIRY_TODAY if i == 0 else EPG_EXPIRY) - margin
+
+        stale = [id for id in ids if fetched.get((id, day.timestamp), 0) < now - expiry]
+        if stale:
+            windows.append((day, stale))
+
+    def progress(done, total):
+        log('EPG: Downloaded {}/{}'.format(done, total))
+
+    for day, channels, events in api.epg_windows(windows, progress=progress):
+        rows = []
+        for row in events:
+            genre = row.get('genres', '')
+            if genre:
+                genre = genre[0]
+
+            rows.append({
+                'channel':  row['channel'],
+                'start':    xmltv.to_timestamp(row['start']),
+                'stop':     xmltv.to_timestamp(row['end']),
+                'title':    row['title'],
+                'desc':     row.get('synopsis'),
+                'category': genre,
+            })
+
+        day_start = day.timestamp
+        day_end   = day.shift(days=1).timestamp
+
+        with database.db.atomic():
+            Event.delete_where(Event.channel.in_(channels), Event.start >= day_start, Event.start < day_end)
+            Event.replace_many(rows)
+            EPGWindow.replace_many([{'channel': id, 'day': day_start, 'fetched': now} for id in channels])
+
+    Event.delete_where(Event.stop < today.shift(days=-1).timestamp)
+    EPGWindow.delete_where(EPGWindow.day < today.shift(days=-1).timestamp)
+
+    log('EPG: Refreshed {} of {} windows'.format(sum(len(w[1]) for w in windows), len(ids) * (days + 1)))
+
 @plugin.route()
 @plugin.merge()
 def epg(output, days, **kwargs):
-    now = arrow.utcnow()
+    now  = arrow.utcnow()
+    days = int(days)
 
-    with open(output, 'wb') as f:
-        f.write('<?xml version="1.0" encoding="utf-8" ?><tv>')
-        
+    if not userdata.get('epg_used'):
+        userdata.set('epg_used', True)
+
+    with open(output, 'wb') as f, xmltv.Writer(f) as writer:
         ids = []
         for row in _get_channels():
             if not row['channel']:
                 continue
 
-            f.write('<channel id="{}"><display-name>{}</display-name><icon src="{}"/></channel>'.format(row['channel'], escape(row['label']).encode('utf8'), escape(row['image'])))
+            writer.channel(row['channel'], row['label'], row['image'])
             ids.append(row['channel'])
 
-        for i in range(int(days)):
-            for row in api.epg(ids, start=now.shift(days=i)):
-                genre = row.get('genres', '')
-                if genre:
-                    genre = genre[0]
+        _refresh_epg(ids, now, days)
+
+        query = Event.select(Event.channel, Event.start, Event.stop, Event.title, Event.desc, Event.category) \
+            .where(Event.channel.in_(ids), Event.stop > now.timestamp, Event.start < now.shift(days=days).timestamp) \
+            .order_by(Event.start)
+
+        for row in query.tuples().iterator():
+            writer.programme(*row)
+
+    log('EPG: Wrote {} programmes in {:.2f}s'.format(writer.programmes, (arrow.utcnow() - now).total_seconds()))
+
+def _prewarm_token():
+    return api.refresh_play_token()
+
+def _prewarm_channels():
+    api.channels(refresh=True)
+    return time() + CHANNELS_EXPIRY
+
+def _prewarm_subscriptions():
+    api.refresh_subscriptions()
+    return time() + SUBSCRIPTIONS_EXPIRY
+
+def _prewarm_epg():
+    # only for users of the IPTV Merge epg route
+    if not userdata.get('epg_used'):
+        return time() + EPG_EXPIRY_TODAY
+
+    now  = arrow.utcnow()
+    ids  = [row['channel'] for row in _get_channels() if row['channel']]
+    days = 1 if now.shift(hours=PREWARM_EPG_HOURS).day != now.day else 0
+
+    _refresh_epg(ids, now, days, margin=EPG_EXPIRY_TODAY * (1 - PREWARM_RATIO))
+    return time() + EPG_EXPIRY_TODAY
+
+def _prewarm_search():
+    # only for users of search or A-Z, it crawls every section
+    if not userdata.get('titles_used'):
+        return time() + TITLE_INDEX_REFRESH
+
+    for section in SEARCH_SECTIONS:
+        _title_index(section, '')
+
+    return time() + TITLE_INDEX_EXPIRY
+
+PREWARM_TASKS = [
+    ['token',         _prewarm_token],
+    ['channels',      _prewarm_channels],
+    ['subscriptions', _prewarm_subscriptions],
+    ['epg',           _prewarm_epg],
+    ['search',        _prewarm_search],
+]
+
+@signals.on(signals.ON_SERVICE)
+def prewarm():
+    if not api.logged_in:
+        return
+
+    schedule = mem_cache.get(PREWARM_KEY) or {}
+
+    for name, func in PREWARM_TASKS:
+        now   = time()
+        state = schedule.get(name, {'next': 0, 'failures': 0})
+
+        if state['next'] > now:
+            continue
+
+        try:
+            expires = func()
+        except Exception as e:
+            state['failures'] += 1
+            state['next'] = now + min(PREWARM_RETRY * 2 ** (state['failures'] - 1), PREWARM_MAX_RETRY)
+            log.exception(e)
+        else:
+            state['failures'] = 0
+            state['next'] = now + max(PREWARM_MIN, (expires - now) * PREWARM_RATIO)
 
-                f.write('<programme channel="{}" start="{}" stop="{}"><title>{}</title><desc>{}</desc><category>{}</category></programme>'.format(
-                    row['channel'], arrow.get(row['start']).format('YYYYMMDDHHmmss Z'), arrow.get(row['end']).format('YYYYMMDDHHmmss Z'), escape(row['title']).encode('utf8'),
-                    escape(row.get('synopsis', '')).encode('utf8'), escape(genre).encode('utf8')))
+        log('Prewarm: {} next in {}s'.format(name, int(state['next'] - now)))
+        schedule[name] = state
 
-        f.write('</tv>')
\ No newline at end of file
+    mem_cache.set(PREWARM_KEY, schedule)
\ No newline at end of file
@@ -0,0 +1,3 @@
+from resources.lib.matthuisman.service import run
+
+run()
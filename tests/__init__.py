@@ -0,0 +1,10 @@
+# Runs the add-on outside Kodi: python -m unittest discover -s tests -t .
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault('KODI_SPECIAL', tempfile.mkdtemp(prefix='kodi'))
+sys.path.insert(0, os.path.join(ROOT, 'tests', 'stubs'))
+sys.path.insert(0, ROOT)
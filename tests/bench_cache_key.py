@@ -0,0 +1,62 @@
+# Cache key collisions and build time over synthetic calls
+#   python -m tests.bench_cache_key [count]
+import sys
+from time import time
+
+from resources.lib.matthuisman.util import cache_key, hash_6
+
+SECTIONS = ['', 'movies', 'tv', 'sport', u'caf\xe9']
+SORTS    = ['TITLE', 'LATEST', 'LASTCHANCE']
+
+def calls(count):
+    # look-alike argument lists: same text, different types or boundaries
+    i = 0
+    while True:
+        n       = i // 10
+        section = SECTIONS[n % len(SECTIONS)]
+        shape   = i % 10
+
+        if shape == 0:
+            yield 'content', (section,), {'sortby': SORTS[n % 3], 'start': n}
+        elif shape == 1:
+            yield 'content', (section,), {'sortby': SORTS[n % 3], 'start': str(n)}
+        elif shape == 2:
+            yield 'content', (section, n), {}
+        elif shape == 3:
+            yield 'content', (section + str(n),), {}
+        elif shape == 4:
+            yield 'series', (str(n),), {}
+        elif shape == 5:
+            yield 'series', (n, ''), {}
+        elif shape == 6:
+            yield 'series', (float(n),), {}
+        elif shape == 7:
+            yield 'epg', ([str(n), str(n+1)],), {}
+        elif shape == 8:
+            yield 'epg', ([str(n) + str(n+1)],), {}
+        else:
+            yield 'epg', ({'day': n, 'channels': section},), {}
+
+        i += 1
+        if i >= count:
+            return
+
+def main(count=1000000):
+    keys = set()
+    old  = set()
+
+    start = time()
+    for func_name, args, kwargs in calls(count):
+        keys.add(cache_key(func_name, *args, **kwargs))
+    elapsed = time() - start
+
+    for func_name, args, kwargs in calls(count):
+        old.add(hash_6(u'{}{}{}'.format(func_name, args, sorted(kwargs.items())).encode('utf8')))
+
+    print('{} calls: {} keys, {} collisions, {:.2f}us per key'.format(count, len(keys), count - len(keys), elapsed / count * 1e6))
+    print('hash_6 of the same calls: {} collisions'.format(count - len(old)))
+
+    return count - len(keys)
+
+if __name__ == '__main__':
+    sys.exit(1 if main(*[int(arg) for arg in sys.argv[1:]]) else 0)
@@ -0,0 +1,73 @@
+# Cache value codecs: stored size, write and read latency on api-shaped payloads
+#   python -m tests.bench_database [rows]
+import os
+import sys
+import json
+import shutil
+import sqlite3
+import tempfile
+from time import time
+
+from resources.lib.matthuisman import database
+from resources.lib.matthuisman.constants import DB_COMPRESS_THRESHOLD
+
+from .bench_xmltv import FIXTURE
+
+def payloads():
+    with open(FIXTURE) as f:
+        events = json.load(f)['events']
+
+    content = {'index': 50, 'available': 400, 'data': [{
+        'id': 'CONTENT{}'.format(i), 'title': u'Title {}'.format(i), 'type': 'movie', 'year': 2000 + i % 20,
+        'synopsis': events[i % len(events)]['synopsis'] * 3, 'genres': ['Drama', 'Comedy'][:i % 2 + 1],
+        'images': {'PS': '/images/ps/{}.jpg'.format(i), 'LS': '/images/ls/{}.jpg'.format(i)},
+        'channel': 'SKY MOVIES', 'rating': 'M', 'duration': 5400 + i,
+    } for i in range(50)]}
+
+    series = {'id': 'SERIES1', 'title': 'A Series', 'images': {'PS': '/ps.jpg'}, 'subContent': [{
+        'id': 'EP{}'.format(i), 'episodeTitle': u'Episode {}'.format(i), 'seasonNumber': i // 10 + 1, 'episodeNumber': i % 10 + 1,
+        'synopsis': events[i % len(events)]['synopsis'], 'duration': 2700,
+    } for i in range(40)]}
+
+    return [('epg day', events), ('content page', content), ('series', series)]
+
+def run(compression, rows):
+    path = tempfile.mkdtemp()
+    db   = sqlite3.connect(os.path.join(path, 'bench.db'))
+    db.execute('CREATE TABLE cache (key TEXT PRIMARY KEY, value BLOB)')
+
+    values = [(name, value) for name, value in payloads()]
+
+    start = time()
+    with db:
+        for i in range(rows):
+            name, value = values[i % len(values)]
+            db.execute('INSERT INTO cache VALUES (?, ?)', ('{}{}'.format(name, i), sqlite3.Binary(database.encode(value, compression, DB_COMPRESS_THRESHOLD))))
+    write = time() - start
+
+    start = time()
+    for key, value in db.execute('SELECT key, value FROM cache'):
+        database.decode(value)
+    read = time() - start
+
+    db.execute('VACUUM')
+    db.close()
+    size = os.path.getsize(os.path.join(path, 'bench.db'))
+    shutil.rmtree(path)
+
+    print('{:<5} {} rows: db {:.2f}MB, write {:.2f}ms/row, read {:.2f}ms/row'.format(
+        compression or 'raw', rows, size / 1048576.0, write / rows * 1000, read / rows * 1000))
+
+def main(rows=300):
+    for name, value in payloads():
+        print('{}: {} bytes pickled'.format(name, len(database.encode(value, None))))
+
+    for compression in (None, 'zlib', 'lzma'):
+        if compression == 'lzma' and not database.lzma:
+            print('lzma  unavailable')
+            continue
+
+        run(compression, rows)
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
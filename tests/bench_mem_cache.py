@@ -0,0 +1,74 @@
+# Per-dispatch mem_cache overhead against cache size:
+# the old single pickle of the whole cache vs the index + per-key window properties
+#   python -m tests.bench_mem_cache [dispatches]
+import sys
+import random
+from time import time
+
+try:
+    import cPickle as pickle
+except:
+    import pickle
+
+import xbmcgui
+
+from resources.lib.matthuisman import mem_cache
+
+SIZES  = (100, 1000, 5000)
+_window = xbmcgui.Window(10000)
+
+def value(i):
+    # roughly a listing row, ~500 bytes pickled
+    return {'id': str(i), 'title': u'Title {}'.format(i), 'synopsis': u'x' * 300, 'images': {'PS': 'ps{}.jpg'.format(i)}, 'ratings': [i, 'PG']}
+
+def dispatch_old(keys, rand):
+    # load, read a few, write one, sweep and save the lot
+    data = pickle.loads(_window.getProperty('bench.old'))
+
+    for key in rand.sample(keys, 3):
+        data.get(key)
+    data[rand.choice(keys)] = [value(0), time() + 3600]
+
+    now = time()
+    for key in [key for key in data if data[key][1] < now]:
+        data.pop(key)
+
+    _window.setProperty('bench.old', pickle.dumps(data))
+
+def dispatch_new(keys, rand, fresh):
+    if fresh:
+        # a new interpreter has nothing resident
+        mem_cache.cache.gen = None
+
+    mem_cache.load()
+
+    for key in rand.sample(keys, 3):
+        mem_cache.get(key)
+    mem_cache.set(rand.choice(keys), value(0), 3600)
+
+    mem_cache.remove_expired()
+
+def main(dispatches=50):
+    rand = random.Random(1)
+
+    for size in SIZES:
+        keys = ['key{}'.format(i) for i in range(size)]
+
+        _window.setProperty('bench.old', pickle.dumps(dict((key, [value(i), time() + 3600]) for i, key in enumerate(keys))))
+
+        mem_cache.empty()
+        for i, key in enumerate(keys):
+            mem_cache.set(key, value(i), 3600)
+        mem_cache.remove_expired()
+
+        results = []
+        for name, func in (('whole pickle', lambda: dispatch_old(keys, rand)), ('index fresh', lambda: dispatch_new(keys, rand, True)), ('index reused', lambda: dispatch_new(keys, rand, False))):
+            start = time()
+            for i in range(dispatches):
+                func()
+            results.append('{} {:.2f}ms'.format(name, (time() - start) / dispatches * 1000))
+
+        print('{:>5} entries ({:.1f}MB): {}'.format(size, len(_window.getProperty('bench.old')) / 1048576.0, ' / '.join(results)))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,36 @@
+# New connections (each a TLS handshake against the real hosts) across simulated dispatches
+#   python -m tests.bench_session [dispatches] [requests]
+# latency and handshake are simulated by the local server
+import sys
+from time import time
+
+from resources.lib.matthuisman import session
+
+from .server import Server
+
+def dispatches(server, count, requests, pooled):
+    start = time()
+
+    for i in range(count):
+        # a reused invoker keeps the module, a fresh Session is what every dispatch did before
+        s = session.get('bench', {'User-Agent': 'bench'}) if pooled else session.Session({'User-Agent': 'bench'})
+
+        for j in range(requests):
+            s.get(server.url + '/dispatch/{}/{}'.format(i, j))
+
+        if not pooled:
+            s.close()
+
+    return time() - start
+
+def main(count=20, requests=5, latency=0.01, handshake=0.05):
+    for pooled in (False, True):
+        with Server(latency, handshake=handshake) as server:
+            elapsed = dispatches(server, count, requests, pooled)
+            print('{:<9} {} dispatches x {} requests: {} new connections, {:.2f}s'.format(
+                'pooled' if pooled else 'unpooled', count, requests, server.connections, elapsed))
+
+    session.get('bench').close()
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
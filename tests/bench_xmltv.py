@@ -0,0 +1,96 @@
+# XMLTV output speed and memory, replaying a recorded api.epg payload
+#   python -m tests.bench_xmltv [days]
+import os
+import sys
+import json
+import resource
+import subprocess
+from time import time
+from xml.sax.saxutils import escape
+
+import arrow
+
+from resources.lib.matthuisman import xmltv
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'epg_events.json')
+
+class NullFile(object):
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+def events(days):
+    with open(FIXTURE) as f:
+        recorded = json.load(f)['events']
+
+    # the recorded day repeated, shifted a day at a time
+    for day in range(days):
+        for row in recorded:
+            row = dict(row)
+            row['start'] = arrow.get(row['start']).shift(days=day).isoformat()
+            row['end']   = arrow.get(row['end']).shift(days=day).isoformat()
+            yield row
+
+def write_arrow(f, rows):
+    # the epg route before xmltv.Writer
+    f.write('<?xml version="1.0" encoding="utf-8" ?><tv>')
+    for row in rows:
+        genre = row.get('genres', '')
+        if genre:
+            genre = genre[0]
+
+        f.write('<programme channel="{}" start="{}" stop="{}"><title>{}</title><desc>{}</desc><category>{}</category></programme>'.format(
+            row['channel'], arrow.get(row['start']).format('YYYYMMDDHHmmss Z'), arrow.get(row['end']).format('YYYYMMDDHHmmss Z'), escape(row['title']).encode('utf8'),
+            escape(row.get('synopsis', '')).encode('utf8'), escape(genre).encode('utf8')))
+    f.write('</tv>')
+
+def ingest(rows):
+    # what _refresh_epg stores in the events table
+    stored = []
+    for row in rows:
+        genre = row.get('genres', '')
+        if genre:
+            genre = genre[0]
+
+        stored.append((row['channel'], xmltv.to_timestamp(row['start']), xmltv.to_timestamp(row['end']), row['title'], row.get('synopsis'), genre))
+
+    return stored
+
+def write_writer(f, rows):
+    with xmltv.Writer(f) as writer:
+        for row in rows:
+            writer.programme(*row)
+
+def run(mode, days):
+    rows = list(events(days))
+    f    = NullFile()
+
+    start = time()
+    if mode == 'arrow':
+        write_arrow(f, rows)
+        timing = ''
+    else:
+        rows   = ingest(rows)
+        stored = time() - start
+        write_writer(f, rows)
+        output = time() - start - stored
+        timing = ' (ingest {:.2f}s, output {:.2f}s: {:.0f} events/sec)'.format(stored, output, len(rows) / output)
+
+    elapsed = time() - start
+
+    # ru_maxrss is kilobytes on linux
+    print('{:<7} {} events in {:.2f}s: {:.0f} events/sec{}, {:.1f}MB written, peak rss {:.1f}MB'.format(
+        mode, len(rows), elapsed, len(rows) / elapsed, timing, f.size / 1048576.0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0))
+
+def main(days=7):
+    # each mode in its own process so peak rss isn't shared
+    for mode in ('arrow', 'writer'):
+        subprocess.check_call([sys.executable, '-m', 'tests.bench_xmltv', '--mode', mode, str(days)])
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--mode']:
+        run(sys.argv[2], int(sys.argv[3]))
+    else:
+        main(*[int(arg) for arg in sys.argv[1:]])
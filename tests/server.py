@@ -0,0 +1,100 @@
+# Local HTTP stand-in for the Sky APIs with artificial latency
+import json
+import socket
+import threading
+from time import sleep
+from urlparse import urlparse, parse_qsl
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        sleep(self.server.handshake)
+
+    def do_GET(self):
+        server = self.server
+        url    = urlparse(self.path)
+        params = dict(parse_qsl(url.query))
+
+        with server.lock:
+            server.requests.append((url.path, params))
+
+        sleep(server.latency)
+
+        body = json.dumps(server.routes.get(url.path, lambda params: {})(params))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# latency is per request, handshake is per new connection (eg. a TLS handshake)
+class Server(ThreadingMixIn, HTTPServer):
+    def __init__(self, latency=0, routes=None, handshake=0):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), Handler)
+        self.latency   = latency
+        self.handshake = handshake
+        self.routes    = routes or {}
+        self.requests  = []
+        self.lock      = threading.Lock()
+        self.sockets   = []
+        self.threads   = []
+        self.closed    = False
+
+    @property
+    def connections(self):
+        return len(self.sockets)
+
+    def get_request(self):
+        request = HTTPServer.get_request(self)
+        self.sockets.append(request[0])
+        return request
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+    def process_request(self, request, client_address):
+        thread = threading.Thread(target=self.process_request_thread, args=(request, client_address))
+        thread.daemon = True
+        thread.start()
+        self.threads.append(thread)
+
+    def handle_error(self, request, client_address):
+        # connections cut by __exit__
+        if not self.closed:
+            HTTPServer.handle_error(self, request, client_address)
+
+    def __enter__(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.closed = True
+        self.shutdown()
+        self.server_close()
+
+        # let handlers blocked on kept-alive connections exit
+        for sock in self.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+        for thread in self.threads:
+            thread.join(1)
+
+def epg_events(params):
+    # one hour long event per channel at the window's start
+    start = int(params['startTimestamp'])
+    return {'events': [{'channel': id, 'start': str(start), 'end': str(start + 3600000), 'title': 'Show {}'.format(id)} for id in params['channelIds'].split(',')]}
@@ -0,0 +1,54 @@
+# Minimal stand-in for Kodi's xbmc module, just enough to import and run the add-on outside Kodi
+import os
+
+LOGDEBUG   = 0
+LOGINFO    = 1
+LOGNOTICE  = 2
+LOGWARNING = 3
+LOGERROR   = 4
+LOGSEVERE  = 5
+LOGFATAL   = 6
+LOGNONE    = 7
+
+SPECIAL = os.environ.get('KODI_SPECIAL', '/tmp/kodi')
+
+builtins = []
+
+def log(msg, level=LOGDEBUG):
+    if os.environ.get('KODI_LOG'):
+        print(msg)
+
+def translatePath(path):
+    if path.startswith('special://'):
+        return os.path.join(SPECIAL, path[len('special://'):])
+
+    return path
+
+def executebuiltin(function, wait=False):
+    builtins.append(function)
+
+def executeJSONRPC(jsonrpccommand):
+    return '{}'
+
+def getInfoLabel(infotag):
+    if infotag == 'System.BuildVersion':
+        return '18.0 Git:20190128-d81c34c465'
+
+    return ''
+
+def getCondVisibility(condition):
+    return False
+
+class Monitor(object):
+    def abortRequested(self):
+        return True
+
+    def waitForAbort(self, timeout=0):
+        return True
+
+class Player(object):
+    def play(self, item='', listitem=None, windowed=False, startpos=-1):
+        pass
+
+    def isPlaying(self):
+        return False
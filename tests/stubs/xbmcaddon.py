@@ -0,0 +1,35 @@
+import os
+
+ADDON_PATH = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ADDON_ID   = 'plugin.video.skygo.nz'
+
+settings = {}
+
+class Addon(object):
+    # no id is the add-on that's running
+    def __init__(self, id=''):
+        self._id = id or ADDON_ID
+
+    def getAddonInfo(self, id):
+        return {
+            'id':      self._id,
+            'name':    self._id,
+            'version': '0.0.0',
+            'path':    ADDON_PATH,
+            'profile': 'special://profile/addon_data/{}/'.format(self._id),
+            'icon':    '',
+            'fanart':  '',
+        }[id]
+
+    def getSetting(self, id):
+        return settings.get((self._id, id), '')
+
+    def setSetting(self, id, value):
+        settings[(self._id, id)] = value
+
+    def getLocalizedString(self, id):
+        return str(id)
+
+    def openSettings(self):
+        pass
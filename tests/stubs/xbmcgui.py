@@ -0,0 +1,32 @@
+ALPHANUM_HIDE_INPUT = 2
+
+class Window(object):
+    _properties = {}
+
+    def __init__(self, existingWindowId=-1):
+        pass
+
+    def getProperty(self, key):
+        return Window._properties.get(key, '')
+
+    def setProperty(self, key, value):
+        Window._properties[key] = value
+
+    def clearProperty(self, key):
+        Window._properties.pop(key, None)
+
+class ListItem(object):
+    def __init__(self, label='', label2='', path=''):
+        self.label = label
+        self.path  = path
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+class Dialog(object):
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+class DialogProgress(Dialog):
+    def iscanceled(self):
+        return False
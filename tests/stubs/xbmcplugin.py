@@ -0,0 +1,25 @@
+SORT_METHOD_UNSORTED  = 0
+SORT_METHOD_LABEL     = 1
+SORT_METHOD_DATEADDED = 21
+SORT_METHOD_EPISODE   = 24
+
+items = []
+
+def addDirectoryItems(handle, items_, totalItems=0):
+    items.extend(items_)
+    return True
+
+def endOfDirectory(handle, succeeded=True, updateListing=False, cacheToDisc=True):
+    pass
+
+def setResolvedUrl(handle, succeeded, listitem):
+    pass
+
+def setContent(handle, content):
+    pass
+
+def setPluginCategory(handle, category):
+    pass
+
+def addSortMethod(handle, sortMethod, label2Mask=''):
+    pass
@@ -0,0 +1,52 @@
+import math
+import unittest
+from time import time
+
+import arrow
+
+from resources.lib import api as api_module
+from resources.lib.api import API
+from resources.lib.matthuisman import database
+
+from .server import Server, epg_events
+
+LATENCY = 0.2
+
+class EPGWindowsTest(unittest.TestCase):
+    def setUp(self):
+        database.connect()
+
+        self.server = Server(LATENCY, {'/events': epg_events}).__enter__()
+        self._epg_url = api_module.EPG_URL
+        api_module.EPG_URL = self.server.url + '/events'
+
+        self.api = API()
+        self.api.new_session()
+
+    def tearDown(self):
+        api_module.EPG_URL = self._epg_url
+        self.server.__exit__(None, None, None)
+
+    def _fetch(self, days, workers):
+        today   = arrow.utcnow().floor('day')
+        windows = [(today.shift(days=i), ['1', '2']) for i in range(days)]
+
+        start   = time()
+        results = list(self.api.epg_windows(windows, workers=workers))
+        return windows, results, time() - start
+
+    def test_round_trips(self):
+        for days, workers in ((8, 4), (7, 4), (3, 1)):
+            windows, results, elapsed = self._fetch(days, workers)
+            round_trips = int(math.ceil(float(days) / workers))
+
+            print('\n{} days / {} workers: {:.2f}s ({} round trips of {}s)'.format(days, workers, elapsed, round_trips, LATENCY))
+            self.assertGreater(elapsed, LATENCY * round_trips * 0.9)
+            self.assertLess(elapsed, LATENCY * (round_trips + 0.9))
+
+    def test_order(self):
+        windows, results, elapsed = self._fetch(8, 4)
+
+        self.assertEqual([(day, ids) for day, ids, events in results], windows)
+        for day, ids, events in results:
+            self.assertEqual([int(row['start']) // 1000 for row in events], [day.timestamp] * len(ids))
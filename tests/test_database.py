@@ -0,0 +1,59 @@
+import pickle
+import unittest
+
+from resources.lib.matthuisman import database
+
+class Row(database.Model):
+    value = database.PickledField(compression='zlib', threshold=0)
+
+VALUE = {'data': [{'id': str(i), 'title': u'Title {}'.format(i), 'synopsis': u'caf\xe9 ' * 50} for i in range(20)], 'index': 20}
+
+class CodecTest(unittest.TestCase):
+    def _round_trip(self, compression, header):
+        data = database.encode(VALUE, compression, threshold=0)
+
+        self.assertEqual(data[:1], header)
+        self.assertEqual(database.decode(data), VALUE)
+        self.assertEqual(database.decode(buffer(data)), VALUE)
+
+    def test_raw(self):
+        self._round_trip(None, database.CODEC_RAW)
+
+    def test_zlib(self):
+        self._round_trip('zlib', database.CODEC_ZLIB)
+
+    def test_lzma(self):
+        if not database.lzma:
+            self.skipTest('lzma unavailable')
+
+        self._round_trip('lzma', database.CODEC_LZMA)
+
+    def test_lzma_fallback(self):
+        lzma = database.lzma
+        database.lzma = None
+        try:
+            self._round_trip('lzma', database.CODEC_ZLIB)
+        finally:
+            database.lzma = lzma
+
+    def test_threshold(self):
+        self.assertEqual(database.encode('small', 'zlib', threshold=1024)[:1], database.CODEC_RAW)
+
+    def test_legacy_pickle(self):
+        for protocol in (0, 2):
+            self.assertEqual(database.decode(pickle.dumps(VALUE, protocol)), VALUE)
+
+    def test_lzma_unavailable(self):
+        lzma = database.lzma
+        database.lzma = None
+        try:
+            self.assertRaises(database.DecodeError, database.decode, database.CODEC_LZMA + 'data')
+        finally:
+            database.lzma = lzma
+
+    def test_field(self):
+        field  = Row.value
+        stored = field.db_value(VALUE)
+
+        self.assertEqual(field.python_value(stored), VALUE)
+        self.assertEqual(field.db_value(field.encode(VALUE)), stored)
@@ -0,0 +1,33 @@
+import time
+import unittest
+
+from resources.lib.matthuisman import mem_cache
+
+class MemCacheTest(unittest.TestCase):
+    def setUp(self):
+        mem_cache.empty()
+        mem_cache.save()
+
+    def _saved_size(self):
+        return sum(row[1] for row in mem_cache.cache.index.values())
+
+    def test_remove_expired(self):
+        mem_cache.set('short', 'a' * 100, expires=-1)
+        mem_cache.set('long', 'b' * 100, expires=60)
+        mem_cache.set('reset', 'c' * 100, expires=-1)
+        mem_cache.set('reset', 'c' * 100, expires=60)
+
+        mem_cache.remove_expired()
+
+        self.assertEqual(sorted(mem_cache.cache.index), ['long', 'reset'])
+        self.assertEqual(mem_cache.cache.size, self._saved_size())
+
+    def test_reload(self):
+        mem_cache.set('key', range(10), expires=60)
+        mem_cache.remove_expired()
+
+        mem_cache.cache.gen = None
+        mem_cache.load()
+
+        self.assertEqual(mem_cache.get('key'), range(10))
+        self.assertEqual(mem_cache.cache.size, self._saved_size())
@@ -0,0 +1,69 @@
+import random
+import unittest
+from time import time
+
+from resources.lib import plugin
+from resources.lib.models import Title, TitleIndex, SearchIndex
+from resources.lib.matthuisman import database
+
+WORDS = ['night', 'river', 'house', 'storm', 'garden', 'silver', 'winter', 'island', 'doctor', 'empire', 'shadow', 'crown']
+
+def _row(id, title, synopsis=''):
+    return {'id': id, 'title': title, 'synopsis': synopsis, 'channel': 'TV1'}
+
+def _synthetic(count, seed=1):
+    rand = random.Random(seed)
+    return [_row(str(i), u' '.join(rand.sample(WORDS, 3)), u' '.join(rand.sample(WORDS, 8))) for i in range(count)]
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        database.connect()
+        if not SearchIndex.available():
+            self.skipTest('fts5 unavailable')
+
+        TitleIndex.delete().execute()
+        self._content_all = plugin.api.content_all
+
+    def tearDown(self):
+        plugin.api.content_all = self._content_all
+
+    def _build(self, rows):
+        plugin.api.content_all = lambda **kwargs: {'data': rows}
+        TitleIndex.delete().execute()
+        plugin._title_index('movies', '')
+
+    def test_rebuild_drops_stale_rows(self):
+        self._build([_row('1', 'Alpha Movie'), _row('2', 'Bravo Movie')])
+        self.assertEqual([row['id'] for row in SearchIndex.search('bravo')], ['2'])
+
+        self._build([_row('1', 'Alpha Movie')])
+        self.assertEqual(SearchIndex.search('bravo'), [])
+        self.assertEqual([row['id'] for row in SearchIndex.search('alpha')], ['1'])
+        self.assertEqual(Title.select().where(Title.catalogue == u'movies|').count(), 1)
+
+    def test_non_ascii_query(self):
+        self._build([_row('1', u'Am\xe9lie'), _row('2', 'Amadeus')])
+
+        self.assertEqual([row['id'] for row in SearchIndex.search('Am\xc3\xa9lie')], ['1'])
+        self.assertEqual([row['id'] for row in SearchIndex.search(u'Am\xe9lie')], ['1'])
+
+    def test_catalogue_queries(self):
+        count = 5000
+        self._build(_synthetic(count) + [_row('title', 'Kaikoura Coast'), _row('synopsis', 'Other Show', 'a trip down the kaikoura coast')])
+
+        # title matches outrank synopsis matches, partial words match as prefixes
+        self.assertEqual([row['id'] for row in SearchIndex.search('kaikoura')], ['title', 'synopsis'])
+        self.assertEqual([row['id'] for row in SearchIndex.search('kaik coa')], ['title', 'synopsis'])
+
+        rows = SearchIndex.search('riv')
+        self.assertEqual(len(rows), 200)
+        self.assertTrue(all('river' in row['title'] for row in rows[:10]))
+
+        queries = ['night', 'stor gard', 'silver crown', 'isl', 'doctor empire shadow'] * 10
+        start   = time()
+        for query in queries:
+            SearchIndex.search(query)
+        elapsed = (time() - start) / len(queries)
+
+        print('\n{} rows: {:.1f}ms per query'.format(count, elapsed * 1000))
+        self.assertLess(elapsed, 0.05)
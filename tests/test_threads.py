@@ -0,0 +1,34 @@
+import time
+import unittest
+
+from resources.lib.matthuisman import threads
+
+class PoolTest(unittest.TestCase):
+    def test_imap_order(self):
+        # later items finish first
+        def work(item):
+            time.sleep(0.01 * (5 - item))
+            return item * 2
+
+        with threads.Pool(4, name='Test') as pool:
+            self.assertEqual(list(pool.imap(work, range(5))), [0, 2, 4, 6, 8])
+
+    def test_imap_exception(self):
+        def work(item):
+            if item == 2:
+                raise ValueError(item)
+            return item
+
+        with threads.Pool(2, name='Test') as pool:
+            results = pool.imap(work, range(4))
+            self.assertEqual(next(results), 0)
+            self.assertEqual(next(results), 1)
+            self.assertRaises(ValueError, next, results)
+
+    def test_join_timeout(self):
+        pool = threads.Pool(1, name='Test')
+        pool.submit(time.sleep, 0.5)
+
+        self.assertFalse(pool.join(0.05))
+        self.assertTrue(pool.join())
+        pool.close()
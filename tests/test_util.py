@@ -0,0 +1,34 @@
+import unittest
+
+from resources.lib.matthuisman.util import cache_key
+
+from .bench_cache_key import calls
+
+class Thing(object):
+    pass
+
+class Other(object):
+    pass
+
+class CacheKeyTest(unittest.TestCase):
+    def test_argument_boundaries(self):
+        self.assertNotEqual(cache_key('f', 1, ''), cache_key('f', '1'))
+        self.assertNotEqual(cache_key('f', 'ab', 'c'), cache_key('f', 'a', 'bc'))
+        self.assertNotEqual(cache_key('f', 1), cache_key('f', '1'))
+
+    def test_argument_order(self):
+        self.assertNotEqual(cache_key('f', 1, 2), cache_key('f', 2, 1))
+        self.assertEqual(cache_key('f', a=1, b=2), cache_key('f', b=2, a=1))
+
+    def test_non_primitives(self):
+        self.assertNotEqual(cache_key('f', Thing(), 1), cache_key('f', 1))
+        self.assertNotEqual(cache_key('f', Thing()), cache_key('f', ''))
+        self.assertNotEqual(cache_key('f', Thing()), cache_key('f', Other()))
+        self.assertEqual(cache_key('f', Thing(), 1), cache_key('f', Thing(), 1))
+
+    def test_stable(self):
+        self.assertEqual(cache_key('f', u'caf\xe9', [1, {'a': None}]), cache_key('f', u'caf\xe9', [1, {'a': None}]))
+
+    def test_synthetic_calls(self):
+        keys = set(cache_key(func_name, *args, **kwargs) for func_name, args, kwargs in calls(50000))
+        self.assertEqual(len(keys), 50000)